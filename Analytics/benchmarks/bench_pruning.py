@@ -0,0 +1,198 @@
+"""
+bench_pruning.py
+---------------------------------------------------------
+Planning latency of SmartQueryEngine's file/row-group pruning as the lake
+grows: the previous single-column SQL plan (parquet_column_stats joined to
+parquet_files) against the in-memory zone-map index over the clustered parquet_row_groups /
+parquet_zone_maps tables.
+
+Synthetic metadata for one table is generated straight into a temporary
+metadata database (no Parquet files), 4 regions, FILES_PER_PARTITION files
+per region and date and 2 row groups per file. The index is timed cold
+(load + first column) and warm (median of repeated selects).
+
+Usage:
+    python -m Analytics.benchmarks.bench_pruning --files 10000 100000 1000000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import duckdb
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "metadata_pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+from metadata_auto_loader import PARTITION_ROLLUP_SQL, cluster_zone_maps, create_metadata_schema  # noqa: E402
+from predicates import normalize, predicate_columns  # noqa: E402
+from zone_map_index import ZoneMapIndex  # noqa: E402
+
+TABLE = "bench_table"
+REGIONS = 4
+FILES_PER_PARTITION = 250
+ROW_GROUPS = 2
+ROWS_PER_GROUP = 100_000
+
+# (label, region, date_range as day offsets from the latest date,
+#  column_filter built from days_back(n) -> ISO date n days before the latest date and the days generated)
+CASES = [
+    ("1 day, 1 region, amount > x", "r0", (0, 0), lambda days_back, span: ("sales_amount", ">", 9_000.0)),
+    ("30 days, all regions, amount > x", None, (29, 0), lambda days_back, span: ("sales_amount", ">", 9_000.0)),
+    ("all dates, 1 region, date BETWEEN", "r1", None, lambda days_back, span: (
+        "order_date", "BETWEEN", (days_back(span // 2 + 6), days_back(span // 2)),
+    )),
+    ("30 days, amount > x AND date OR", None, (29, 0), lambda days_back, span: [
+        ("sales_amount", ">", 9_000.0),
+        {"or": [("order_date", "<", days_back(41)), ("order_date", "IN", [days_back(11), days_back(10)])]},
+    ]),
+]
+STATS_TYPES = {"sales_amount": "double", "order_date": "date"}
+
+PREVIOUS_SQL = """
+    SELECT s.file_name, s.row_group, s.row_group_num_rows,
+           (SUM(s.row_group_num_rows) OVER (PARTITION BY s.file_name ORDER BY s.row_group)
+             - s.row_group_num_rows)::BIGINT AS first_row,
+           {hit} AS hit
+    FROM parquet_column_stats s JOIN parquet_files f USING (file_name)
+    WHERE {where} AND s.column_name = $column
+    ORDER BY s.file_name, s.row_group
+"""
+
+
+def build_metadata(db_file, files):
+    """One table, dates going back from 2025-10-31 until ``files`` files exist."""
+    con = duckdb.connect(db_file)
+    create_metadata_schema(con)
+    partitions = max(files // (REGIONS * FILES_PER_PARTITION), 1)
+    con.execute(f"""
+        CREATE TEMP TABLE gen_files AS
+        SELECT '{TABLE}' AS table_name, 'r' || (p % {REGIONS}) AS region,
+               strftime(DATE '2025-10-31' - (p // {REGIONS})::INT, '%Y-%m-%d') AS eod_date,
+               'file:///bench/{TABLE}/region=r' || (p % {REGIONS}) || '/eod_date='
+                 || strftime(DATE '2025-10-31' - (p // {REGIONS})::INT, '%Y-%m-%d')
+                 || '/part-' || lpad(i::VARCHAR, 4, '0') || '.parquet' AS file_name,
+               p * {FILES_PER_PARTITION} + i AS k
+        FROM range({partitions * REGIONS}) a(p), range({FILES_PER_PARTITION}) b(i);
+    """)
+    con.execute(f"""
+        INSERT INTO parquet_files
+        SELECT file_name, table_name, region, eod_date, 50000000, TIMESTAMP '2025-11-01', NULL,
+               {ROW_GROUPS * ROWS_PER_GROUP}, {ROW_GROUPS}, TIMESTAMP '2025-11-01'
+        FROM gen_files;
+    """)
+    con.execute(f"""
+        CREATE TEMP TABLE gen_stats AS
+        SELECT g.table_name, g.region, g.eod_date, g.file_name, rg AS row_group, c.column_name,
+               {ROWS_PER_GROUP}::BIGINT AS row_group_num_rows, c.stats_type,
+               CASE WHEN c.stats_type = 'double' THEN (hash(g.k, rg) % 9000)::DOUBLE END AS min_double,
+               CASE WHEN c.stats_type = 'double' THEN (hash(g.k, rg) % 9000 + 1000)::DOUBLE END AS max_double,
+               CASE WHEN c.stats_type = 'date' THEN g.eod_date::DATE - 30 + (rg * 15)::INT END AS min_date,
+               CASE WHEN c.stats_type = 'date' THEN g.eod_date::DATE - 15 + (rg * 15)::INT END AS max_date
+        FROM gen_files g, range({ROW_GROUPS}) r(rg),
+             (VALUES ('sales_amount', 'double'), ('order_date', 'date')) c(column_name, stats_type);
+    """)
+    con.execute("""
+        INSERT INTO parquet_column_stats BY NAME
+        SELECT file_name, row_group, column_name, row_group_num_rows, stats_type,
+               min_double, max_double, min_date, max_date
+        FROM gen_stats;
+    """)
+    con.execute("""
+        INSERT INTO parquet_row_groups BY NAME
+        SELECT DISTINCT table_name, region, eod_date, file_name, row_group,
+               row_group * row_group_num_rows AS first_row, row_group_num_rows AS num_rows
+        FROM gen_stats;
+    """)
+    con.execute("""
+        INSERT INTO parquet_zone_maps BY NAME
+        SELECT table_name, column_name, eod_date, file_name, row_group, stats_type,
+               min_double, max_double, min_date, max_date
+        FROM gen_stats;
+    """)
+    con.execute(f"INSERT INTO parquet_partitions {PARTITION_ROLLUP_SQL} GROUP BY table_name, region, eod_date;")
+    cluster_zone_maps(con)
+    con.execute("CHECKPOINT;")
+    con.close()
+    return partitions * REGIONS * FILES_PER_PARTITION
+
+
+def date_span(con):
+    """(days_back(n) -> ISO date n days before the latest generated date, number of days generated)."""
+    first, latest = con.execute("SELECT MIN(eod_date)::DATE, MAX(eod_date)::DATE FROM parquet_partitions").fetchone()
+    return (lambda n: str(latest.fromordinal(latest.toordinal() - n))), (latest - first).days + 1
+
+
+def previous_plan(con, region, date_range, column_filter):
+    col, op, val = column_filter
+    params = {"table": TABLE, "column": col}
+    where = ["f.table_name = $table"]
+    if region:
+        where.append("f.region = $region")
+        params["region"] = region
+    if date_range:
+        where.append("f.eod_date BETWEEN $d0 AND $d1")
+        params["d0"], params["d1"] = date_range
+    if op == "BETWEEN":
+        hit = "(s.min_date IS NULL OR s.max_date IS NULL OR (s.max_date >= $v0::DATE AND s.min_date <= $v1::DATE))"
+        params["v0"], params["v1"] = val
+    else:
+        hit = "(s.min_double IS NULL OR s.max_double IS NULL OR s.max_double > $v0)"
+        params["v0"] = val
+    return con.execute(PREVIOUS_SQL.format(hit=hit, where=" AND ".join(where)), params).df()
+
+
+def timed(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[3])
+    parser.add_argument("--files", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for files in args.files:
+            db_file = os.path.join(tmp, f"pruning_{files}.duckdb")
+            start = time.perf_counter()
+            files = build_metadata(db_file, files)
+            print(f"\n📦 {files:,} files / {files * ROW_GROUPS:,} row groups "
+                  f"(built in {time.perf_counter() - start:.1f}s)")
+            con = duckdb.connect(db_file, read_only=True)
+
+            start = time.perf_counter()
+            index = ZoneMapIndex(con, TABLE)
+            print(f"{'index load':>36}: {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+            days_back, span = date_span(con)
+            for label, region, offsets, column_filter in CASES:
+                date_range = tuple(days_back(d) for d in offsets) if offsets else None
+                predicate = normalize(column_filter(days_back, span))
+                stats_types = {c: STATS_TYPES[c] for c in predicate_columns(predicate)}
+                if len(predicate) == 3:
+                    sql_ms, _ = timed(lambda: previous_plan(con, region, date_range, predicate), args.repeats)
+                    sql = f"SQL {sql_ms:9.1f} ms"
+                else:
+                    sql = f"SQL {'n/a':>9}   "
+                start = time.perf_counter()
+                index.select(con, region, date_range, predicate, stats_types)
+                cold_ms = (time.perf_counter() - start) * 1000
+                warm_ms, selection = timed(
+                    lambda: index.select(con, region, date_range, predicate, stats_types), args.repeats
+                )
+                print(f"{label:>36}: {sql} | index cold {cold_ms:9.1f} ms, "
+                      f"warm {warm_ms:8.2f} ms -> {len(selection):,} files")
+            con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+bench_startup.py
+---------------------------------------------------------
+Measures cold-start cost of the analytics entry points, each in a fresh
+interpreter: module import time, engine/loader connection setup, and whether
+heavy modules (pandas, matplotlib, boto3) were pulled in eagerly.
+
+Reports the median over a few runs; with --max-ms any scenario slower than the
+budget (or importing a heavy module it should defer) fails the run, so it can
+guard CI against start-up regressions.
+
+Usage:
+    python -m Analytics.benchmarks.bench_startup --runs 5 --max-ms 500
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PIPELINE_DIR = os.path.join(REPO_ROOT, "Analytics", "metadata_pipeline")
+HEAVY_MODULES = ["pandas", "matplotlib", "boto3"]
+
+# (label, setup code timed inside the child, heavy modules it may legitimately load)
+SCENARIOS = [
+    ("import duckdb_batch_variance", "import Analytics.duckdb_batch_variance", []),
+    ("import smart_query_engine", "import smart_query_engine", []),
+    ("import metadata_auto_loader", "import metadata_auto_loader", ["pandas", "boto3"]),
+    ("SmartQueryEngine()", "import smart_query_engine; smart_query_engine.SmartQueryEngine(db_file={db!r})", []),
+    ("connect_duckdb()", "import metadata_auto_loader as m; m.DUCKDB_FILE = {db!r}; m.connect_duckdb()",
+     ["pandas", "boto3"]),
+]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_once(code, db):
+    child = CHILD.format(code=code.format(db=db), heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([REPO_ROOT, PIPELINE_DIR, os.environ.get("PYTHONPATH", "")]))
+    proc = subprocess.run([sys.executable, "-c", child], capture_output=True, text=True, env=env, cwd=REPO_ROOT)
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if re.match(r"[\w.]+(Error|Exception)\b", line)]
+        raise RuntimeError((errors or proc.stderr.strip().splitlines())[-1])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[3])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if any scenario's median exceeds this")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "startup_bench.duckdb")
+        for label, code, allowed_heavy in SCENARIOS:
+            try:
+                results = [run_once(code, db) for _ in range(args.runs)]
+            except RuntimeError as exc:
+                print(f"{label:>30}: ❌ {exc}")
+                failed = True
+                continue
+            median = statistics.median(r["ms"] for r in results)
+            heavy = sorted(set(results[0]["heavy"]) - set(allowed_heavy))
+            slow = args.max_ms is not None and median > args.max_ms
+            failed |= slow or bool(heavy)
+            note = f"  ⚠️ eagerly imports {', '.join(heavy)}" if heavy else ""
+            print(f"{label:>30}: {'❌' if slow else '✅'} median {median:7.1f} ms over {args.runs} runs{note}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
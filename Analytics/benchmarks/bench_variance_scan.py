@@ -0,0 +1,86 @@
+"""
+bench_variance_scan.py
+---------------------------------------------------------
+Compares the single-pass variance plan against the legacy two-CTE +
+FULL OUTER JOIN plan on a synthetic Hive-partitioned batch metrics lake.
+
+Reports the number of Parquet scans in the physical plan and the best
+wall time over a few repeats.
+
+Usage:
+    python -m Analytics.benchmarks.bench_variance_scan --rows 10000000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import duckdb
+
+from Analytics.duckdb_batch_variance import _create_metrics_view, _variance_sql
+
+REGION = "APAC"
+BASELINE_DATE = "2025-10-01"
+COMPARE_DATE = "2025-10-08"
+
+
+def build_lake(root, rows):
+    con = duckdb.connect()
+    for i, eod_date in enumerate([BASELINE_DATE, COMPARE_DATE]):
+        part_dir = os.path.join(root, f"region={REGION}", f"eod-date={eod_date}")
+        os.makedirs(part_dir, exist_ok=True)
+        con.execute(f"""
+            COPY (
+                SELECT 'group_' || (k % 50) AS parameter_group,
+                       'inst_' || (k % 400) AS instance_name,
+                       'model_' || (k % 250) AS model_name,
+                       (hash(k, {i}) % 1000) / 10.0 AS calc_node_raw_hours,
+                       (hash(k, {i} + 1) % 500) / 10.0 AS model_cpu_hours,
+                       (hash(k, {i} + 2) % 300) / 10.0 AS security_count_thousands
+                FROM range({rows // 2}) t(k)
+            ) TO '{part_dir}/part-0001.parquet' (FORMAT PARQUET)
+        """)
+    con.close()
+
+
+def count_parquet_scans(nodes):
+    return sum(
+        (node["name"] in ("PARQUET_SCAN", "READ_PARQUET")) + count_parquet_scans(node.get("children", []))
+        for node in nodes
+    )
+
+
+def bench(con, single_pass, repeats):
+    sql = _variance_sql(REGION, BASELINE_DATE, COMPARE_DATE, single_pass)
+    plan = con.execute("EXPLAIN (FORMAT JSON) " + sql.strip().rstrip(";")).fetchall()
+    scans = count_parquet_scans(json.loads(plan[0][1]))
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        n = len(con.execute(sql).fetchall())
+        timings.append(time.perf_counter() - start)
+    return scans, min(timings), n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[3])
+    parser.add_argument("--rows", type=int, default=10_000_000, help="total rows across both snapshots")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f"🏗️  Generating {args.rows:,} rows under {root} ...")
+        build_lake(root, args.rows)
+
+        con = duckdb.connect(database=":memory:")
+        _create_metrics_view(con, root, REGION, [BASELINE_DATE, COMPARE_DATE])
+        for label, single_pass in [("two-CTE join", False), ("single-pass", True)]:
+            scans, best, n = bench(con, single_pass, args.repeats)
+            print(f"{label:>14}: {scans} parquet scan(s), best {best:.3f}s over {args.repeats} runs ({n:,} groups)")
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,83 +9,179 @@ using a Hive-style structure:
             eod-date=YYYY-MM-DD/
                 part-0001.parquet
 
+Only the two snapshot partitions being compared are listed and read by
+default (partition pruning); pass ``partition_pruning=False`` to scan the
+whole tree and filter on the region/eod-date derived from each file path.
+
 Outputs:
     - CSVs of flagged variance results & summaries
     - 3 PNG charts:
         1. weighted_param_variance.png
         2. top5_param_groups_weighted.png
         3. top5_models_cpu_variance.png
+
+``run_variance_matrix`` compares N snapshots against one baseline in a single
+scan and writes the same outputs per compare date (``compare_date=<date>/``)
+and/or combined long-format CSVs plus weighted_variance_matrix.png.
+
+``run_multi_region_variance`` fans the single-date analysis out over every
+``region=`` directory with a process pool and merges the results into one
+cross-region report.
 """
 
+import multiprocessing
 import os
+import threading
 import duckdb
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+# numpy, pandas and matplotlib are imported where charts/frames are built, so
+# importing this module (and each pool worker's start-up) stays cheap.
 
-def run_variance_analysis(
-    parquet_root: str,
-    region: str,
-    baseline_date: str,
-    compare_date: str,
-    pct_threshold: float = 0.20,
-    delta_thresholds: dict = None,
-    out_dir: str = "./out"
-):
+
+_shared_db = None
+_shared_db_lock = threading.Lock()
+
+
+def _session(threads=None):
     """
-    Compare two EOD snapshots for a given region and generate variance results.
+    A cursor on the process-wide in-memory DuckDB instance, so repeated runs
+    skip connection setup; views and tables each run creates are TEMP and die
+    with its cursor. ``threads`` is an instance-wide setting, so a capped run
+    gets a private connection instead.
     """
-    if delta_thresholds is None:
-        delta_thresholds = {"raw": 10.0, "cpu": 5.0, "sec": 10.0}
+    global _shared_db
+    if threads:
+        con = duckdb.connect(database=':memory:')
+        con.execute(f"SET threads={int(threads)}")
+        return con
+    with _shared_db_lock:
+        if _shared_db is None:
+            _shared_db = duckdb.connect(database=':memory:')
+    return _shared_db.cursor()
 
-    os.makedirs(out_dir, exist_ok=True)
-    con = duckdb.connect(database=':memory:')
 
-    # 1️⃣ Load Parquet files with Hive-style partitions (region → eod-date)
-    parquet_glob = os.path.join(parquet_root, "**", "*.parquet")
+def _snapshot_files(con, parquet_root: str, region: str, dates: list) -> list:
+    """
+    List the Parquet files of the given EOD partitions using the Hive layout,
+    so only those directories are touched instead of the whole tree.
+    """
+    region_dir = f"region={region}" if region else "region=*"
+    files = []
+    for d in dates:
+        pattern = os.path.join(parquet_root, region_dir, f"eod-date={d}", "*.parquet")
+        files += [row[0] for row in con.execute(f"SELECT file FROM glob('{pattern}')").fetchall()]
+    return sorted(set(files))
+
+
+def _snapshot_regions(con, parquet_root: str) -> list:
+    """List the regions present in the lake from the ``region=`` directory names."""
+    pattern = os.path.join(parquet_root, "region=*", "eod-date=*", "*.parquet")
+    rows = con.execute(f"""
+        SELECT DISTINCT regexp_extract(file, 'region=([^/]+)', 1) AS region
+        FROM glob('{pattern}')
+        ORDER BY region
+    """).fetchall()
+    return [row[0] for row in rows]
+
+
+def _snapshot_dates(con, parquet_root: str, region: str, start_date: str, end_date: str) -> list:
+    """
+    List the EOD dates present in the lake between ``start_date`` and
+    ``end_date`` (inclusive), read from the ``eod-date=`` directory names.
+    """
+    region_dir = f"region={region}" if region else "region=*"
+    pattern = os.path.join(parquet_root, region_dir, "eod-date=*", "*.parquet")
+    rows = con.execute(f"""
+        SELECT DISTINCT regexp_extract(file, 'eod-date=([0-9-]+)', 1)::DATE AS eod_date
+        FROM glob('{pattern}')
+        WHERE eod_date BETWEEN DATE '{start_date}' AND DATE '{end_date}'
+        ORDER BY eod_date
+    """).fetchall()
+    return [str(row[0]) for row in rows]
+
+
+def _create_metrics_view(con, parquet_root: str, region: str, dates: list, partition_pruning: bool = True) -> bool:
+    """
+    Create the ``batch_metrics_parquet`` view over the lake, deriving region
+    and eod_date from the Hive path. Returns False when no snapshot files exist.
+    """
+    if partition_pruning:
+        files = _snapshot_files(con, parquet_root, region, dates)
+        if not files:
+            return False
+        parquet_source = "[" + ", ".join(f"'{f}'" for f in files) + "]"
+    else:
+        parquet_source = "'" + os.path.join(parquet_root, "**", "*.parquet") + "'"
     con.execute(f"""
-        CREATE VIEW batch_metrics_parquet AS
+        CREATE OR REPLACE TEMP VIEW batch_metrics_parquet AS
         SELECT
             *,
             regexp_extract(filename, 'region=([^/]+)', 1) AS region,
             regexp_extract(filename, 'eod-date=([0-9-]+)', 1)::DATE AS eod_date
-        FROM parquet_scan('{parquet_glob}', recursive=true)
+        FROM parquet_scan({parquet_source}, hive_partitioning=false, filename=true)
     """)
+    return True
 
-    region_filter = f"AND region = '{region}'" if region else ""
 
-    # 2️⃣ Main SQL — join baseline and compare, compute deltas & % change
-    sql = f"""
-    WITH
+_DELTA_COLUMNS = """
+           (comp_raw_hours - base_raw_hours) AS delta_raw_hours,
+           (comp_model_cpu_hours - base_model_cpu_hours) AS delta_model_cpu_hours,
+           (comp_security_thousands - base_security_thousands) AS delta_security_thousands,
+           CASE WHEN base_raw_hours=0 THEN NULL ELSE (comp_raw_hours-base_raw_hours)/base_raw_hours END AS pct_raw_hours,
+           CASE WHEN base_model_cpu_hours=0 THEN NULL ELSE (comp_model_cpu_hours-base_model_cpu_hours)/base_model_cpu_hours END AS pct_model_cpu_hours,
+           CASE WHEN base_security_thousands=0 THEN NULL ELSE (comp_security_thousands-base_security_thousands)/base_security_thousands END AS pct_security_thousands"""
+
+
+def _variance_sql(region: str, baseline_date: str, compare_date: str, single_pass: bool = True) -> str:
+    """
+    Build the baseline vs compare variance SQL over ``batch_metrics_parquet``.
+
+    The single-pass plan filters to both dates once and pivots with
+    ``SUM(...) FILTER (WHERE eod_date = ...)``; the legacy plan aggregates each
+    date in its own CTE and FULL OUTER JOINs them, scanning the data twice.
+    """
+    region_filter = f"AND bm.region = '{region}'" if region else ""
+
+    if single_pass:
+        joined = f"""
+    joined AS (
+      SELECT bm.region, parameter_group, instance_name, model_name,
+             COALESCE(SUM(calc_node_raw_hours) FILTER (WHERE eod_date = DATE '{baseline_date}'), 0.0) AS base_raw_hours,
+             COALESCE(SUM(calc_node_raw_hours) FILTER (WHERE eod_date = DATE '{compare_date}'), 0.0) AS comp_raw_hours,
+             COALESCE(SUM(model_cpu_hours) FILTER (WHERE eod_date = DATE '{baseline_date}'), 0.0) AS base_model_cpu_hours,
+             COALESCE(SUM(model_cpu_hours) FILTER (WHERE eod_date = DATE '{compare_date}'), 0.0) AS comp_model_cpu_hours,
+             COALESCE(SUM(security_count_thousands) FILTER (WHERE eod_date = DATE '{baseline_date}'), 0.0) AS base_security_thousands,
+             COALESCE(SUM(security_count_thousands) FILTER (WHERE eod_date = DATE '{compare_date}'), 0.0) AS comp_security_thousands
+      FROM batch_metrics_parquet bm
+      WHERE bm.eod_date IN (DATE '{baseline_date}', DATE '{compare_date}') {region_filter}
+      GROUP BY bm.region, parameter_group, instance_name, model_name
+    )"""
+    else:
+        joined = f"""
     params AS (
       SELECT
-        '{region}'::VARCHAR AS region,
         DATE '{baseline_date}' AS baseline_date,
-        DATE '{compare_date}' AS compare_date,
-        {pct_threshold} AS pct_threshold,
-        {delta_thresholds['raw']} AS raw_delta_threshold,
-        {delta_thresholds['cpu']} AS cpu_delta_threshold,
-        {delta_thresholds['sec']} AS sec_delta_threshold
+        DATE '{compare_date}' AS compare_date
     ),
     agg_base AS (
-      SELECT region, eod_date, parameter_group, instance_name, model_name,
+      SELECT bm.region, eod_date, parameter_group, instance_name, model_name,
              SUM(calc_node_raw_hours) AS base_raw_hours,
              SUM(model_cpu_hours) AS base_model_cpu_hours,
              SUM(security_count_thousands) AS base_security_thousands
       FROM batch_metrics_parquet bm, params p
       WHERE bm.eod_date = p.baseline_date {region_filter}
-      GROUP BY region, eod_date, parameter_group, instance_name, model_name
+      GROUP BY bm.region, eod_date, parameter_group, instance_name, model_name
     ),
     agg_comp AS (
-      SELECT region, eod_date, parameter_group, instance_name, model_name,
+      SELECT bm.region, eod_date, parameter_group, instance_name, model_name,
              SUM(calc_node_raw_hours) AS comp_raw_hours,
              SUM(model_cpu_hours) AS comp_model_cpu_hours,
              SUM(security_count_thousands) AS comp_security_thousands
       FROM batch_metrics_parquet bm, params p
       WHERE bm.eod_date = p.compare_date {region_filter}
-      GROUP BY region, eod_date, parameter_group, instance_name, model_name
+      GROUP BY bm.region, eod_date, parameter_group, instance_name, model_name
     ),
     joined AS (
       SELECT COALESCE(b.region, c.region) AS region,
@@ -99,54 +195,178 @@ def run_variance_analysis(
              COALESCE(b.base_security_thousands, 0.0) AS base_security_thousands,
              COALESCE(c.comp_security_thousands, 0.0) AS comp_security_thousands
       FROM agg_base b FULL OUTER JOIN agg_comp c
-        ON b.parameter_group=c.parameter_group AND b.instance_name=c.instance_name AND b.model_name=c.model_name
+        ON b.region=c.region AND b.parameter_group=c.parameter_group
+       AND b.instance_name=c.instance_name AND b.model_name=c.model_name
+    )"""
+
+    return f"""
+    WITH{joined}
+    SELECT *,{_DELTA_COLUMNS}
+    FROM joined;
+    """
+
+
+def _snapshot_agg_sql(region: str, dates: list) -> str:
+    """
+    Aggregate every requested snapshot in one scan, one row per
+    eod_date × region × parameter_group × instance × model.
+    """
+    region_filter = f"AND bm.region = '{region}'" if region else ""
+    date_list = ", ".join(f"DATE '{d}'" for d in dates)
+    return f"""
+    CREATE OR REPLACE TEMP TABLE snapshot_agg AS
+    SELECT bm.region, eod_date, parameter_group, instance_name, model_name,
+           SUM(calc_node_raw_hours) AS raw_hours,
+           SUM(model_cpu_hours) AS model_cpu_hours,
+           SUM(security_count_thousands) AS security_thousands
+    FROM batch_metrics_parquet bm
+    WHERE bm.eod_date IN ({date_list}) {region_filter}
+    GROUP BY bm.region, eod_date, parameter_group, instance_name, model_name;
+    """
+
+
+def _variance_matrix_sql(baseline_date: str, compare_dates: list) -> str:
+    """
+    Long-format variance of each compare date against the baseline, built
+    from ``snapshot_agg``. Keys missing on either side count as 0, matching
+    the FULL OUTER JOIN semantics of the single-date analysis.
+    """
+    date_list = ", ".join(f"DATE '{d}'" for d in compare_dates)
+    return f"""
+    WITH
+    compare_dates AS (
+      SELECT UNNEST([{date_list}]) AS compare_date
+    ),
+    base AS (
+      SELECT * FROM snapshot_agg WHERE eod_date = DATE '{baseline_date}'
+    ),
+    keys AS (
+      SELECT c.compare_date, b.region, b.parameter_group, b.instance_name, b.model_name
+      FROM base b CROSS JOIN compare_dates c
+      UNION
+      SELECT eod_date, region, parameter_group, instance_name, model_name
+      FROM snapshot_agg WHERE eod_date <> DATE '{baseline_date}'
+    ),
+    joined AS (
+      SELECT k.compare_date, k.region, k.parameter_group, k.instance_name, k.model_name,
+             COALESCE(b.raw_hours, 0.0) AS base_raw_hours,
+             COALESCE(c.raw_hours, 0.0) AS comp_raw_hours,
+             COALESCE(b.model_cpu_hours, 0.0) AS base_model_cpu_hours,
+             COALESCE(c.model_cpu_hours, 0.0) AS comp_model_cpu_hours,
+             COALESCE(b.security_thousands, 0.0) AS base_security_thousands,
+             COALESCE(c.security_thousands, 0.0) AS comp_security_thousands
+      FROM keys k
+      LEFT JOIN base b
+        ON b.region=k.region AND b.parameter_group=k.parameter_group
+       AND b.instance_name=k.instance_name AND b.model_name=k.model_name
+      LEFT JOIN snapshot_agg c
+        ON c.eod_date=k.compare_date AND c.region=k.region AND c.parameter_group=k.parameter_group
+       AND c.instance_name=k.instance_name AND c.model_name=k.model_name
     )
-    SELECT *,
-           (comp_raw_hours - base_raw_hours) AS delta_raw_hours,
-           (comp_model_cpu_hours - base_model_cpu_hours) AS delta_model_cpu_hours,
-           (comp_security_thousands - base_security_thousands) AS delta_security_thousands,
-           CASE WHEN base_raw_hours=0 THEN NULL ELSE (comp_raw_hours-base_raw_hours)/base_raw_hours END AS pct_raw_hours,
-           CASE WHEN base_model_cpu_hours=0 THEN NULL ELSE (comp_model_cpu_hours-base_model_cpu_hours)/base_model_cpu_hours END AS pct_model_cpu_hours,
-           CASE WHEN base_security_thousands=0 THEN NULL ELSE (comp_security_thousands-base_security_thousands)/base_security_thousands END AS pct_security_thousands
+    SELECT *,{_DELTA_COLUMNS}
     FROM joined;
     """
 
-    df = con.execute(sql).df()
-    con.close()
-    if df.empty:
-        print("No records found.")
-        return {}
 
-    # 3️⃣ Flag significant variances
-    df["raw_var_flag"] = (abs(df["pct_raw_hours"]) > pct_threshold) | (abs(df["delta_raw_hours"]) > delta_thresholds["raw"])
-    df["cpu_var_flag"] = (abs(df["pct_model_cpu_hours"]) > pct_threshold) | (abs(df["delta_model_cpu_hours"]) > delta_thresholds["cpu"])
-    df["sec_var_flag"] = (abs(df["pct_security_thousands"]) > pct_threshold) | (abs(df["delta_security_thousands"]) > delta_thresholds["sec"])
-    df["any_metric_flag"] = df[["raw_var_flag", "cpu_var_flag", "sec_var_flag"]].any(axis=1)
-
-    flagged = df[df["any_metric_flag"]].copy()
-    flagged[["pct_raw_hours", "pct_model_cpu_hours", "pct_security_thousands"]] *= 100
-
-    # 4️⃣ Weighted % change aggregation
-    def weighted_pct(g, base_col, delta_col):
-        base_sum = g[base_col].sum()
-        return (g[delta_col].sum() / base_sum * 100) if base_sum != 0 else np.nan
-
-    param_var = (
-        flagged.groupby("parameter_group")
-        .apply(lambda g: pd.Series({
-            "weighted_pct_raw": weighted_pct(g, "base_raw_hours", "delta_raw_hours"),
-            "weighted_pct_cpu": weighted_pct(g, "base_model_cpu_hours", "delta_model_cpu_hours"),
-            "weighted_pct_sec": weighted_pct(g, "base_security_thousands", "delta_security_thousands")
-        }))
-        .reset_index()
+def _flagged_sql(pct_threshold: float, delta_thresholds: dict) -> str:
+    """
+    Materialize the ``flagged`` table from ``variance``: rows where any metric
+    moves by more than ``pct_threshold`` or its absolute delta threshold,
+    with % columns scaled to percent.
+    """
+    return f"""
+    CREATE OR REPLACE TEMP TABLE flagged AS
+    WITH flags AS (
+      SELECT *,
+             COALESCE(ABS(pct_raw_hours) > {pct_threshold}, FALSE)
+               OR ABS(delta_raw_hours) > {delta_thresholds['raw']} AS raw_var_flag,
+             COALESCE(ABS(pct_model_cpu_hours) > {pct_threshold}, FALSE)
+               OR ABS(delta_model_cpu_hours) > {delta_thresholds['cpu']} AS cpu_var_flag,
+             COALESCE(ABS(pct_security_thousands) > {pct_threshold}, FALSE)
+               OR ABS(delta_security_thousands) > {delta_thresholds['sec']} AS sec_var_flag
+      FROM variance
+    )
+    SELECT * REPLACE (
+             pct_raw_hours * 100 AS pct_raw_hours,
+             pct_model_cpu_hours * 100 AS pct_model_cpu_hours,
+             pct_security_thousands * 100 AS pct_security_thousands
+           ),
+           raw_var_flag OR cpu_var_flag OR sec_var_flag AS any_metric_flag
+    FROM flags
+    WHERE raw_var_flag OR cpu_var_flag OR sec_var_flag;
+    """
+
+
+def _param_var_sql(top_n: int = 5, by_compare_date: bool = False) -> str:
+    """
+    Weighted % change per parameter group over ``flagged`` (sum of deltas /
+    sum of baselines), ranked by the total absolute weighted %. With
+    ``by_compare_date`` the top ``top_n`` groups are kept per compare date.
+    """
+    keys = "compare_date, parameter_group" if by_compare_date else "parameter_group"
+    if by_compare_date:
+        top = f"""QUALIFY ROW_NUMBER() OVER (
+      PARTITION BY compare_date ORDER BY total_weighted_abs DESC, parameter_group
+    ) <= {top_n}
+    ORDER BY compare_date, total_weighted_abs DESC, parameter_group"""
+    else:
+        top = f"""ORDER BY total_weighted_abs DESC, parameter_group
+    LIMIT {top_n}"""
+    return f"""
+    WITH weighted AS (
+      SELECT {keys},
+             SUM(delta_raw_hours) / NULLIF(SUM(base_raw_hours), 0) * 100 AS weighted_pct_raw,
+             SUM(delta_model_cpu_hours) / NULLIF(SUM(base_model_cpu_hours), 0) * 100 AS weighted_pct_cpu,
+             SUM(delta_security_thousands) / NULLIF(SUM(base_security_thousands), 0) * 100 AS weighted_pct_sec
+      FROM flagged
+      GROUP BY {keys}
     )
-    param_var["total_weighted_abs"] = (
-        param_var[["weighted_pct_raw", "weighted_pct_cpu", "weighted_pct_sec"]]
-        .abs().sum(axis=1)
+    SELECT *,
+           COALESCE(ABS(weighted_pct_raw), 0) + COALESCE(ABS(weighted_pct_cpu), 0)
+             + COALESCE(ABS(weighted_pct_sec), 0) AS total_weighted_abs
+    FROM weighted
+    {top};
+    """
+
+
+def _model_var_sql(top_n: int = 5, by_compare_date: bool = False) -> str:
+    """
+    Mean CPU % change and total CPU delta per model over ``flagged``, ranked
+    by the absolute mean % change (per compare date with ``by_compare_date``).
+    """
+    keys = "compare_date, model_name" if by_compare_date else "model_name"
+    if by_compare_date:
+        top = f"""QUALIFY ROW_NUMBER() OVER (
+      PARTITION BY compare_date ORDER BY pct_model_cpu_hours DESC NULLS LAST, model_name
+    ) <= {top_n}
+    ORDER BY compare_date, pct_model_cpu_hours DESC NULLS LAST, model_name"""
+    else:
+        top = f"""ORDER BY pct_model_cpu_hours DESC NULLS LAST, model_name
+    LIMIT {top_n}"""
+    return f"""
+    WITH models AS (
+      SELECT {keys},
+             ABS(AVG(pct_model_cpu_hours)) AS pct_model_cpu_hours,
+             ABS(SUM(delta_model_cpu_hours)) AS delta_model_cpu_hours
+      FROM flagged
+      GROUP BY {keys}
     )
-    param_var = param_var.sort_values("total_weighted_abs", ascending=False).head(5)
+    SELECT * FROM models
+    {top};
+    """
 
-    # 5️⃣ Weighted Variance Chart (green/red)
+
+def _write_outputs(flagged, param_var, model_var, pct_threshold: float, out_dir: str) -> dict:
+    """
+    Write the three variance charts and the flagged/summary CSVs for one
+    baseline vs compare comparison into ``out_dir``.
+    """
+    import numpy as np
+    import matplotlib.pyplot as plt
+
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Weighted Variance Chart (green/red)
     labels = param_var["parameter_group"].tolist()
     x = np.arange(len(labels))
     width = 0.25
@@ -168,7 +388,7 @@ def run_variance_analysis(
     plt.savefig(chart1_path, dpi=150)
     plt.close(fig)
 
-    # 6️⃣ Top 5 Parameter Groups (stacked absolute weighted %)
+    # Top 5 Parameter Groups (stacked absolute weighted %)
     fig2, ax2 = plt.subplots(figsize=(8, 5))
     ax2.bar(param_var["parameter_group"], param_var["weighted_pct_raw"].abs(), label="Raw")
     ax2.bar(param_var["parameter_group"], param_var["weighted_pct_cpu"].abs(),
@@ -184,14 +404,7 @@ def run_variance_analysis(
     plt.savefig(chart2_path, dpi=150)
     plt.close(fig2)
 
-    # 7️⃣ Top Models by CPU Variance
-    model_var = (
-        flagged.groupby("model_name")[["pct_model_cpu_hours", "delta_model_cpu_hours"]]
-        .agg({"pct_model_cpu_hours": "mean", "delta_model_cpu_hours": "sum"})
-        .abs()
-        .sort_values("pct_model_cpu_hours", ascending=False)
-        .head(5)
-    )
+    # Top Models by CPU Variance
     if not model_var.empty:
         fig3, ax3 = plt.subplots(figsize=(8, 5))
         y = np.arange(len(model_var))
@@ -209,22 +422,324 @@ def run_variance_analysis(
     else:
         chart3_path = None
 
-    # 8️⃣ Export CSVs
+    # Export CSVs
     flagged.to_csv(os.path.join(out_dir, "flagged_variances.csv"), index=False)
     param_var.to_csv(os.path.join(out_dir, "top5_param_groups_weighted.csv"), index=False)
     if not model_var.empty:
         model_var.to_csv(os.path.join(out_dir, "top5_models_cpu_variance.csv"))
 
+    return {
+        "weighted_param_variance": chart1_path,
+        "top5_param_groups_weighted": chart2_path,
+        "top5_models_cpu_variance": chart3_path,
+    }
+
+
+def _write_matrix_outputs(flagged, param_var, model_var, out_dir: str) -> dict:
+    """
+    Write long-format CSVs keyed by compare_date and a heatmap of the top
+    parameter groups' total weighted % change per compare date.
+    """
+    import numpy as np
+    import matplotlib.pyplot as plt
+
+    os.makedirs(out_dir, exist_ok=True)
+    flagged.to_csv(os.path.join(out_dir, "flagged_variances_matrix.csv"), index=False)
+    param_var.to_csv(os.path.join(out_dir, "top5_param_groups_weighted_matrix.csv"), index=False)
+    model_var.to_csv(os.path.join(out_dir, "top5_models_cpu_variance_matrix.csv"), index=False)
+
+    if param_var.empty:
+        return {"weighted_variance_matrix": None}
+
+    heat = param_var.pivot(index="parameter_group", columns="compare_date", values="total_weighted_abs")
+    fig, ax = plt.subplots(figsize=(max(8, 0.4 * len(heat.columns) + 4), max(4, 0.4 * len(heat) + 2)))
+    im = ax.imshow(heat.values, aspect="auto", cmap="Reds")
+    ax.set_xticks(np.arange(len(heat.columns)))
+    ax.set_xticklabels([str(c)[:10] for c in heat.columns], rotation=90)
+    ax.set_yticks(np.arange(len(heat.index)))
+    ax.set_yticklabels(heat.index)
+    ax.set_xlabel("Compare Date")
+    ax.set_title("Top 5 Parameter Groups by Total Weighted Variance per Compare Date")
+    fig.colorbar(im, ax=ax, label="Absolute Weighted % Change")
+    plt.tight_layout()
+    chart_path = os.path.join(out_dir, "weighted_variance_matrix.png")
+    plt.savefig(chart_path, dpi=150)
+    plt.close(fig)
+    return {"weighted_variance_matrix": chart_path}
+
+
+def run_variance_analysis(
+    parquet_root: str,
+    region: str,
+    baseline_date: str,
+    compare_date: str,
+    pct_threshold: float = 0.20,
+    delta_thresholds: dict = None,
+    out_dir: str = "./out",
+    partition_pruning: bool = True,
+    single_pass: bool = True,
+    threads: int = None
+):
+    """
+    Compare two EOD snapshots for a given region and generate variance results.
+
+    With ``partition_pruning`` enabled only ``region=<region>/eod-date=<date>``
+    directories for the baseline and compare dates are read. ``single_pass``
+    aggregates both snapshots in one scan; set it to False to fall back to
+    the two-CTE + FULL OUTER JOIN plan. ``threads`` caps DuckDB's worker
+    threads for this run (defaults to all cores).
+    """
+    if delta_thresholds is None:
+        delta_thresholds = {"raw": 10.0, "cpu": 5.0, "sec": 10.0}
+
+    os.makedirs(out_dir, exist_ok=True)
+    con = _session(threads)
+
+    # 1️⃣ Load Parquet files with Hive-style partitions (region → eod-date)
+    if not _create_metrics_view(con, parquet_root, region, [baseline_date, compare_date], partition_pruning):
+        con.close()
+        print("No records found.")
+        return {}
+
+    # 2️⃣ Main SQL — pivot baseline and compare, compute deltas & % change
+    sql = _variance_sql(region, baseline_date, compare_date, single_pass)
+
+    con.execute(f"CREATE TEMP TABLE variance AS {sql.strip().rstrip(';')}")
+    if con.execute("SELECT COUNT(*) FROM variance").fetchone()[0] == 0:
+        con.close()
+        print("No records found.")
+        return {}
+
+    # 3️⃣ Flag significant variances
+    con.execute(_flagged_sql(pct_threshold, delta_thresholds))
+    flagged = con.execute("SELECT * FROM flagged").df()
+
+    # 4️⃣ Weighted % change aggregation + model rollup
+    param_var = con.execute(_param_var_sql()).df()
+    model_var = con.execute(_model_var_sql()).df().set_index("model_name")
+    con.close()
+
+    # 5️⃣ Charts + CSV exports
+    charts = _write_outputs(flagged, param_var, model_var, pct_threshold, out_dir)
+
     print(f"\n✅ Analysis complete! Charts saved to {out_dir}")
-    print(f" - {chart1_path}\n - {chart2_path}\n - {chart3_path}")
+    print(" - " + "\n - ".join(str(path) for path in charts.values()))
+
+    return {
+        "flagged": flagged,
+        "param_var": param_var,
+        "model_var": model_var,
+        "charts": charts,
+    }
+
+
+def run_variance_matrix(
+    parquet_root: str,
+    region: str,
+    baseline_date: str,
+    compare_dates: list = None,
+    date_window: tuple = None,
+    pct_threshold: float = 0.20,
+    delta_thresholds: dict = None,
+    out_dir: str = "./out",
+    outputs: str = "per_date",
+    partition_pruning: bool = True
+):
+    """
+    Compare several EOD snapshots against one baseline, scanning the lake once.
+
+    Compare dates come from ``compare_dates`` or, with ``date_window=(start, end)``,
+    from every snapshot present in the lake within that window. Results are
+    long-format frames keyed by ``compare_date``. ``outputs`` selects
+    "per_date" (charts + CSVs under ``compare_date=<date>/``), "combined"
+    (matrix CSVs + heatmap in ``out_dir``) or "both".
+    """
+    if delta_thresholds is None:
+        delta_thresholds = {"raw": 10.0, "cpu": 5.0, "sec": 10.0}
+    if outputs not in ("per_date", "combined", "both"):
+        raise ValueError(f"outputs must be 'per_date', 'combined' or 'both', got {outputs!r}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    con = _session()
+
+    # 1️⃣ Resolve compare dates (explicit list or every snapshot in the window)
+    if date_window:
+        compare_dates = _snapshot_dates(con, parquet_root, region, *date_window)
+    compare_dates = sorted({str(d) for d in compare_dates or []} - {str(baseline_date)})
+    if not compare_dates:
+        con.close()
+        print("No compare dates found.")
+        return {}
+
+    # 2️⃣ Aggregate baseline + every compare snapshot in one scan
+    dates = [baseline_date] + compare_dates
+    if not _create_metrics_view(con, parquet_root, region, dates, partition_pruning):
+        con.close()
+        print("No records found.")
+        return {}
+    con.execute(_snapshot_agg_sql(region, dates))
+
+    # 3️⃣ Long-format variance keyed by compare_date
+    sql = _variance_matrix_sql(baseline_date, compare_dates)
+    con.execute(f"CREATE TEMP TABLE variance AS {sql.strip().rstrip(';')}")
+    if con.execute("SELECT COUNT(*) FROM variance").fetchone()[0] == 0:
+        con.close()
+        print("No records found.")
+        return {}
+
+    # 4️⃣ Flag + weighted % / model rollups per compare date
+    con.execute(_flagged_sql(pct_threshold, delta_thresholds))
+    flagged = con.execute("SELECT * FROM flagged ORDER BY compare_date").df()
+    param_var = con.execute(_param_var_sql(by_compare_date=True)).df()
+    model_var = con.execute(_model_var_sql(by_compare_date=True)).df()
+    con.close()
+
+    # 5️⃣ Charts + CSV exports, per compare date and/or combined
+    import pandas as pd
+
+    charts = {}
+    if outputs in ("per_date", "both"):
+        for d in compare_dates:
+            key = pd.Timestamp(d)
+            charts[d] = _write_outputs(
+                flagged[flagged["compare_date"] == key],
+                param_var[param_var["compare_date"] == key],
+                model_var[model_var["compare_date"] == key].drop(columns="compare_date").set_index("model_name"),
+                pct_threshold,
+                os.path.join(out_dir, f"compare_date={d}"),
+            )
+    if outputs in ("combined", "both"):
+        charts["combined"] = _write_matrix_outputs(flagged, param_var, model_var, out_dir)
+
+    print(f"\n✅ Variance matrix complete! {len(compare_dates)} compare dates vs {baseline_date}, outputs in {out_dir}")
 
     return {
+        "compare_dates": compare_dates,
         "flagged": flagged,
         "param_var": param_var,
         "model_var": model_var,
-        "charts": {
-            "weighted_param_variance": chart1_path,
-            "top5_param_groups_weighted": chart2_path,
-            "top5_models_cpu_variance": chart3_path,
+        "charts": charts,
+    }
+
+
+def _run_region_variance(kwargs: dict):
+    """Process-pool entry point: run one region and tag its summaries with the region."""
+    result = run_variance_analysis(**kwargs)
+    if result:
+        result["param_var"].insert(0, "region", kwargs["region"])
+        result["model_var"] = result["model_var"].reset_index()
+        result["model_var"].insert(0, "region", kwargs["region"])
+    return kwargs["region"], result
+
+
+def _write_region_outputs(flagged, param_var, model_var, out_dir: str) -> dict:
+    """
+    Write the merged cross-region CSVs and a chart of flagged rows per region
+    broken down by metric.
+    """
+    import numpy as np
+    import matplotlib.pyplot as plt
+
+    os.makedirs(out_dir, exist_ok=True)
+    flagged.to_csv(os.path.join(out_dir, "flagged_variances_all_regions.csv"), index=False)
+    param_var.to_csv(os.path.join(out_dir, "top5_param_groups_weighted_by_region.csv"), index=False)
+    model_var.to_csv(os.path.join(out_dir, "top5_models_cpu_variance_by_region.csv"), index=False)
+
+    if flagged.empty:
+        return {"flagged_by_region": None}
+
+    counts = flagged.groupby("region")[["raw_var_flag", "cpu_var_flag", "sec_var_flag"]].sum()
+    x = np.arange(len(counts))
+    width = 0.25
+    fig, ax = plt.subplots(figsize=(max(8, len(counts) + 4), 5))
+    for i, (col, label) in enumerate([("raw_var_flag", "Raw"), ("cpu_var_flag", "CPU"), ("sec_var_flag", "Security")]):
+        ax.bar(x + (i - 1) * width, counts[col], width, label=label)
+    ax.set_xticks(x)
+    ax.set_xticklabels(counts.index)
+    ax.set_ylabel("Flagged Rows")
+    ax.set_title("Flagged Variances by Region")
+    ax.legend()
+    plt.tight_layout()
+    chart_path = os.path.join(out_dir, "flagged_by_region.png")
+    plt.savefig(chart_path, dpi=150)
+    plt.close(fig)
+    return {"flagged_by_region": chart_path}
+
+
+def run_multi_region_variance(
+    parquet_root: str,
+    baseline_date: str,
+    compare_date: str,
+    regions: list = None,
+    pct_threshold: float = 0.20,
+    delta_thresholds: dict = None,
+    out_dir: str = "./out",
+    max_workers: int = None,
+    threads_per_worker: int = None,
+    partition_pruning: bool = True
+):
+    """
+    Run ``run_variance_analysis`` for every region in parallel.
+
+    Regions default to every ``region=`` directory under ``parquet_root``.
+    Each region runs in its own process with DuckDB capped at
+    ``threads_per_worker`` threads (cores split evenly by default) and writes
+    to ``<out_dir>/region=<region>/``; the merged flagged rows and summaries
+    are written to ``out_dir``.
+    """
+    if regions is None:
+        # A private connection, closed before the pool starts: the shared
+        # session's DuckDB threads must not be alive in this process' workers.
+        con = duckdb.connect(database=':memory:')
+        regions = _snapshot_regions(con, parquet_root)
+        con.close()
+    if not regions:
+        print("No regions found.")
+        return {}
+
+    cpu_count = os.cpu_count() or 1
+    max_workers = min(len(regions), max_workers or cpu_count)
+    if threads_per_worker is None:
+        threads_per_worker = max(1, cpu_count // max_workers)
+
+    jobs = [
+        {
+            "parquet_root": parquet_root,
+            "region": region,
+            "baseline_date": baseline_date,
+            "compare_date": compare_date,
+            "pct_threshold": pct_threshold,
+            "delta_thresholds": delta_thresholds,
+            "out_dir": os.path.join(out_dir, f"region={region}"),
+            "partition_pruning": partition_pruning,
+            "threads": threads_per_worker,
         }
+        for region in regions
+    ]
+    print(f"🌍 Running {len(regions)} regions on {max_workers} workers × {threads_per_worker} DuckDB threads: {regions}")
+    # Spawned, not forked: a fork would copy any live DuckDB instance (and its
+    # thread pool state) into the workers.
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        by_region = dict(pool.map(_run_region_variance, jobs))
+
+    done = [r for r in by_region.values() if r]
+    if not done:
+        print("No records found.")
+        return {}
+
+    import pandas as pd
+
+    flagged = pd.concat([r["flagged"] for r in done], ignore_index=True)
+    param_var = pd.concat([r["param_var"] for r in done], ignore_index=True)
+    model_var = pd.concat([r["model_var"] for r in done], ignore_index=True)
+    charts = _write_region_outputs(flagged, param_var, model_var, out_dir)
+
+    print(f"\n✅ Cross-region analysis complete! {len(done)}/{len(regions)} regions with data, report in {out_dir}")
+
+    return {
+        "regions": by_region,
+        "flagged": flagged,
+        "param_var": param_var,
+        "model_var": model_var,
+        "charts": charts,
     }
@@ -0,0 +1,98 @@
+"""
+async_query_engine.py
+---------------------------------------------------------
+asyncio front end for SmartQueryEngine.
+Queries run on a bounded thread pool (sized to the DuckDB cursor pool by
+default), so the event loop never blocks on S3 reads. Cancelling the awaiting
+task interrupts the DuckDB query on its cursor; independent table queries can
+run concurrently with gather().
+
+Usage:
+    engine = AsyncSmartQueryEngine(read_only=True)
+    emea, nam = await engine.gather([
+        {"table": "table1", "region": "emea", "sql_filter": "sales_amount > 1000"},
+        {"table": "table1", "region": "nam", "sql_filter": "sales_amount > 1000"},
+    ])
+"""
+
+import asyncio
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+from connection_pool import POOL_SIZE
+from smart_query_engine import SmartQueryEngine
+
+ASYNC_WORKERS = POOL_SIZE
+
+
+class _RunningQuery:
+    """Cursor a submitted call is running on, so a cancel can interrupt exactly that query."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.con = None
+        self.cancelled = False
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.con is not None:
+                self.con.interrupt()
+
+
+class AsyncSmartQueryEngine:
+    def __init__(self, engine=None, max_concurrency=ASYNC_WORKERS, **engine_kwargs):
+        self.engine = engine or SmartQueryEngine(**engine_kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="duckdb-query")
+
+    def _call(self, running, fn, args, kwargs):
+        with self.engine._checkout():
+            with running.lock:
+                if running.cancelled:
+                    raise CancelledError()
+                running.con = self.engine.con
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                # Cleared before the cursor goes back to the pool, so a late
+                # cancel cannot interrupt another caller's query.
+                with running.lock:
+                    running.con = None
+
+    async def _submit(self, fn, *args, **kwargs):
+        running = _RunningQuery()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self._call, running, fn, args, kwargs)
+        except asyncio.CancelledError:
+            running.cancel()
+            raise
+
+    async def query(self, table, **kwargs):
+        return await self._submit(self.engine.query, table, **kwargs)
+
+    async def query_arrow(self, table, **kwargs):
+        return await self._submit(self.engine.query_arrow, table, **kwargs)
+
+    async def estimate_bytes(self, table, **kwargs):
+        return await self._submit(self.engine.estimate_bytes, table, **kwargs)
+
+    async def gather(self, requests, arrow=False, return_exceptions=False):
+        """
+        Run independent queries concurrently; ``requests`` are query() keyword
+        dicts (including ``table``). Results come back in request order.
+        Cancelling the gather interrupts every query still running.
+        """
+        run = self.query_arrow if arrow else self.query
+        return await asyncio.gather(
+            *(run(**request) for request in requests), return_exceptions=return_exceptions
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -0,0 +1,193 @@
+"""
+connection_pool.py
+---------------------------------------------------------
+Long-lived DuckDB session shared by SmartQueryEngine instances.
+One database instance per (db_file, read_only): httpfs is loaded and the S3
+credentials are registered as a DuckDB secret once, when the pool is created.
+Readers check out cursors from a fixed set, so concurrent queries run in
+parallel without reconnecting or re-configuring per request.
+
+DuckDB allows one writer process per database file and no readers beside
+it, so the loader publishes a read-only snapshot after each sync
+(publish_snapshot). Read-only pools open the latest snapshot and switch to a
+newer one on the next checkout; without a snapshot they open db_file itself,
+which fails while a loader holds it.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from queue import Empty, Queue
+
+import duckdb
+
+from metadata_utils import ensure_extension
+
+DUCKDB_FILE = "lake_metadata.duckdb"
+S3_REGION = "us-east-1"
+S3_ACCESS_KEY = "YOUR_ACCESS_KEY"
+S3_SECRET_KEY = "YOUR_SECRET_KEY"
+POOL_SIZE = 8
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def configure_session(con):
+    """Load httpfs and register the S3 credentials as an instance-wide secret, visible to every cursor."""
+    ensure_extension(con, "httpfs")
+    con.execute(f"""
+        CREATE OR REPLACE SECRET lake_s3 (
+            TYPE S3, KEY_ID '{S3_ACCESS_KEY}', SECRET '{S3_SECRET_KEY}', REGION '{S3_REGION}'
+        );
+    """)
+
+
+def _snapshot_pointer(db_file):
+    return f"{db_file}.snapshot"
+
+
+def published_snapshot(db_file=DUCKDB_FILE):
+    """Path of the latest snapshot published for ``db_file``, or None."""
+    try:
+        with open(_snapshot_pointer(db_file)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(os.path.dirname(db_file), name) if name else None
+
+
+def publish_snapshot(con, db_file=DUCKDB_FILE):
+    """
+    Copy the database the writer connection ``con`` has open into a new
+    snapshot file next to ``db_file`` and point readers at it. Every snapshot
+    gets its own file name (DuckDB reuses an open instance for a path it has
+    seen), and the previous one is kept for readers switching over; older
+    ones are deleted.
+    """
+    base, ext = os.path.splitext(db_file)
+    path = f"{base}.snapshot-{time.time_ns()}{ext}"
+    previous = published_snapshot(db_file)
+
+    catalog = con.execute("SELECT current_database()").fetchone()[0]
+    quoted_path = path.replace("'", "''")
+    con.execute("CHECKPOINT;")
+    con.execute(f"ATTACH '{quoted_path}' AS lake_snapshot;")
+    try:
+        con.execute(f'COPY FROM DATABASE "{catalog}" TO lake_snapshot;')
+    finally:
+        con.execute("DETACH lake_snapshot;")
+
+    pointer = _snapshot_pointer(db_file)
+    with open(f"{pointer}.tmp", "w") as f:
+        f.write(os.path.basename(path))
+    os.replace(f"{pointer}.tmp", pointer)
+
+    directory, prefix = os.path.dirname(db_file) or ".", os.path.basename(base) + ".snapshot-"
+    keep = {os.path.basename(path), os.path.basename(previous or "")}
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(ext) and name not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass  # still open on a platform that cannot delete open files
+    return path
+
+
+class ConnectionPool:
+    def __init__(self, db_file=DUCKDB_FILE, size=POOL_SIZE, read_only=False):
+        self.db_file = db_file
+        self.size = size
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._open(self._source())
+
+    def _source(self):
+        """File the pool should have open: the latest snapshot for a read-only pool that has one."""
+        return (self.read_only and published_snapshot(self.db_file)) or self.db_file
+
+    def _open(self, path):
+        self.path = path
+        self.root = duckdb.connect(path, read_only=self.read_only)
+        configure_session(self.root)
+        self._idle = Queue()
+        for _ in range(self.size):
+            self._idle.put(self.root.cursor())
+
+    def _refresh(self):
+        """Switch a read-only pool to a newly published snapshot; cursors still out finish on the old one."""
+        if self._source() == self.path:
+            return
+        with self._lock:
+            # Re-read under the lock: a path read before waiting may be older than the one opened meanwhile.
+            path = self._source()
+            if path == self.path:
+                return
+            retired = self._idle
+            self._open(path)
+        _close_idle(retired)
+        retired.put(None)  # wakes checkouts blocked on the retired queue so they retry on the new one
+
+    @contextmanager
+    def connection(self):
+        """Check out a cursor, blocking while all of them are busy."""
+        if self.read_only:
+            self._refresh()
+        while True:
+            with self._lock:
+                idle = self._idle
+            cur = idle.get()
+            if cur is not None:
+                break
+            idle.put(None)  # pass the wake-up on to the next waiter on the retired queue
+        try:
+            yield cur
+        finally:
+            with self._lock:
+                current = idle is self._idle
+                if current:
+                    idle.put(cur)
+            if not current:
+                cur.close()
+
+    def cursor(self):
+        """A cursor outside the pool, for long-running streams that should not hold a slot."""
+        return self.root.cursor()
+
+    def close(self):
+        _close_idle(self._idle)
+        self.root.close()
+
+
+def _close_idle(idle):
+    """Close every cursor waiting in ``idle`` without blocking on ones checked out."""
+    while True:
+        try:
+            cur = idle.get_nowait()
+        except Empty:
+            return
+        if cur is not None:
+            cur.close()
+
+
+def shared_pool(db_file=DUCKDB_FILE, read_only=False, size=POOL_SIZE):
+    """
+    Process-wide pool for a database file, created on first use. DuckDB
+    cannot open one file both read-write and read-only in a process, so a
+    pool in the other mode is refused when it would open the same file (a
+    read-only pool with no published snapshot to read instead).
+    """
+    key = (db_file, read_only)
+    with _pools_lock:
+        if key not in _pools:
+            other = _pools.get((db_file, not read_only))
+            path = (read_only and published_snapshot(db_file)) or db_file
+            if other is not None and other.path == path:
+                raise ValueError(
+                    f"{path} is already open with read_only={other.read_only} in this process; "
+                    f"DuckDB cannot open it with read_only={read_only} as well. Use one mode, or "
+                    f"publish a snapshot (publish_snapshot) for read-only engines to open instead."
+                )
+            _pools[key] = ConnectionPool(db_file, size, read_only)
+        return _pools[key]
@@ -0,0 +1,135 @@
+"""
+local_file_cache.py
+---------------------------------------------------------
+Read-through local disk cache for remote Parquet files (s3://, https://).
+EOD files are immutable once written, so a copy is addressed by
+path + size + ETag (last-modified when no ETag was listed): a rewritten file
+gets a new entry and the old one ages out. Entries are evicted least recently
+used once the cache directory exceeds its byte budget.
+Downloads use boto3 when available (streamed, in parallel); otherwise the
+bytes come through DuckDB's read_blob() over httpfs.
+"""
+
+import hashlib
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+LOCAL_CACHE_BYTES = 50 * 1024**3
+DOWNLOAD_WORKERS = 8
+
+# Local copies handed out to queries that have not finished reading them yet,
+# counted per path across every cache in the process; eviction skips them.
+_in_use = Counter()
+_in_use_lock = threading.Lock()
+
+
+def is_remote(path):
+    return "://" in path
+
+
+def evict_lru(directory, max_bytes, suffix, keep=()):
+    """
+    Delete the least recently used ``*suffix`` files until ``directory`` fits
+    in ``max_bytes``. Paths in ``keep`` (in use or about to be read) are never
+    deleted.
+    """
+    keep = set(keep)
+    entries = [e for e in os.scandir(directory) if e.name.endswith(suffix)]
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    total = sum(e.stat().st_size for e in entries)
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        if entry.path in keep:
+            continue
+        total -= entry.stat().st_size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+class LocalFileCache:
+    def __init__(self, cache_dir, max_bytes=LOCAL_CACHE_BYTES, s3_client_kwargs=None,
+                 download_workers=DOWNLOAD_WORKERS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.download_workers = download_workers
+        self._s3 = None
+        try:
+            import boto3  # imported here so engines without a local cache never load it
+        except ImportError:  # downloads fall back to DuckDB's read_blob()
+            pass
+        else:
+            self._s3 = boto3.client("s3", **(s3_client_kwargs or {}))
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def local_path(self, remote, size, version):
+        digest = hashlib.sha256(f"{remote}|{size}|{version}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.parquet")
+
+    def _download(self, con, remote, tmp_path):
+        if self._s3 is not None and remote.startswith("s3://"):
+            bucket, _, key = remote[len("s3://"):].partition("/")
+            self._s3.download_file(bucket, key, tmp_path)
+            return
+        content = con.execute("SELECT content FROM read_blob($path)", {"path": remote}).fetchone()[0]
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+
+    def _fetch(self, con, remote, size, version):
+        path = self.local_path(remote, size, version)
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self._download(con, remote, tmp_path)
+            if size is not None and os.path.getsize(tmp_path) != size:
+                # Changed since the loader last saw it: read it remotely until metadata catches up.
+                os.remove(tmp_path)
+                return remote
+            os.replace(tmp_path, path)
+        except Exception as exc:
+            print(f"⚠️ Local cache miss for {remote}, reading remotely: {exc}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return remote
+        return path
+
+    def fetch_many(self, con, files):
+        """
+        Map each remote file to a local copy, downloading the missing ones.
+        ``files`` are (remote, size, version) rows; returns {remote: local_path},
+        falling back to the remote path for anything that could not be cached.
+        The local copies stay in use (never evicted) until release() is called
+        with the returned mapping's values.
+        """
+        # Claimed before the existence check, so a concurrent eviction cannot
+        # delete a copy between this call finding it and DuckDB opening it.
+        claimed = [self.local_path(*f) for f in files]
+        with _in_use_lock:
+            _in_use.update(claimed)
+        try:
+            # boto3 downloads run in parallel; read_blob() ones share ``con`` and stay sequential.
+            parallel = [self._s3 is not None and f[0].startswith("s3://") for f in files]
+            with ThreadPoolExecutor(max_workers=self.download_workers) as pool:
+                futures = [pool.submit(self._fetch, con, *f) if p else None for f, p in zip(files, parallel)]
+                local = [fut.result() if fut else self._fetch(con, *f) for f, fut in zip(files, futures)]
+        except BaseException:
+            self.release(claimed)
+            raise
+        # Files that fell back to a remote read hold no claim.
+        self.release(c for c, path in zip(claimed, local) if path != c)
+        with _in_use_lock:
+            evict_lru(self.cache_dir, self.max_bytes, ".parquet", keep=set(_in_use))
+        return {f[0]: path for f, path in zip(files, local)}
+
+    def release(self, paths):
+        """Let eviction reclaim local copies handed out by fetch_many() once their query is done."""
+        with _in_use_lock:
+            _in_use.subtract(p for p in paths if not is_remote(p))
+            for p in [p for p, n in _in_use.items() if n <= 0]:
+                del _in_use[p]
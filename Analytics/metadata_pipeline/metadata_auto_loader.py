@@ -7,12 +7,23 @@ for all Hive-partitioned tables under:
 Partitions: region=<region>/eod_date=<yyyy-mm-dd>/
 Schema is fixed (no drift).
 Usage:
-    python metadata_auto_loader.py
+    python metadata_auto_loader.py [--workers N] [--reconcile]
 """
 
+import argparse
 import duckdb
 import pandas as pd
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue
+
+from connection_pool import publish_snapshot, published_snapshot
+from metadata_utils import ensure_extension
+
+try:
+    import boto3
+except ImportError:  # listing falls back to DuckDB's read_blob() (no ETag)
+    boto3 = None
 
 # --- CONFIG ---
 S3_BUCKET_ROOT = "s3://app_data/data-assist/hive_data"
@@ -20,107 +31,637 @@ DUCKDB_FILE = "lake_metadata.duckdb"
 S3_REGION = "us-east-1"
 S3_ACCESS_KEY = "YOUR_ACCESS_KEY"
 S3_SECRET_KEY = "YOUR_SECRET_KEY"
+INGEST_WORKERS = 8
+LIST_WORKERS = 16
 
 
 # --- CONNECTION ---
-def connect_duckdb():
-    con = duckdb.connect(DUCKDB_FILE)
-    con.execute("INSTALL httpfs; LOAD httpfs;")
+def configure_s3(con):
     con.execute(f"SET s3_region='{S3_REGION}';")
     con.execute(f"SET s3_access_key_id='{S3_ACCESS_KEY}';")
     con.execute(f"SET s3_secret_access_key='{S3_SECRET_KEY}';")
 
+
+def connect_duckdb():
+    con = duckdb.connect(DUCKDB_FILE)
+    ensure_extension(con, "httpfs")
+    configure_s3(con)
+
+    create_metadata_schema(con)
+    return con
+
+
+# --- SCHEMA ---
+# Which typed bound pair a column chunk's stats land in, from its Parquet types.
+# Timestamps/times and binaries without a string annotation (BLOBs, whose
+# stats are escaped bytes) get no typed bounds (never pruned) rather than
+# risk a wrong comparison.
+STRING_TYPE_SQL = """(logical_type LIKE 'String%' OR logical_type LIKE 'Enum%' OR logical_type LIKE 'Json%'
+             OR logical_type IN ('UTF8', 'ENUM', 'JSON'))"""
+STATS_TYPE_SQL = f"""CASE
+        WHEN logical_type LIKE 'Time%' OR logical_type LIKE 'TIME%' THEN NULL
+        WHEN logical_type LIKE 'Date%' OR logical_type = 'DATE' THEN 'date'
+        WHEN logical_type LIKE 'Decimal%' OR logical_type = 'DECIMAL'
+             OR physical_type IN ('FLOAT', 'DOUBLE') THEN 'double'
+        WHEN physical_type IN ('INT32', 'INT64') THEN 'bigint'
+        WHEN {STRING_TYPE_SQL} THEN 'varchar'
+    END"""
+
+# Typed bound column -> (SQL type, expression over statistics_min/max and stats_type).
+TYPED_BOUNDS = {
+    "min_double": ("DOUBLE", "CASE WHEN stats_type = 'double' THEN TRY_CAST(statistics_min AS DOUBLE) END"),
+    "max_double": ("DOUBLE", "CASE WHEN stats_type = 'double' THEN TRY_CAST(statistics_max AS DOUBLE) END"),
+    "min_bigint": ("BIGINT", "CASE WHEN stats_type = 'bigint' THEN TRY_CAST(statistics_min AS BIGINT) END"),
+    "max_bigint": ("BIGINT", "CASE WHEN stats_type = 'bigint' THEN TRY_CAST(statistics_max AS BIGINT) END"),
+    "min_date": ("DATE", "CASE WHEN stats_type = 'date' THEN TRY_CAST(statistics_min AS DATE) END"),
+    "max_date": ("DATE", "CASE WHEN stats_type = 'date' THEN TRY_CAST(statistics_max AS DATE) END"),
+    "min_varchar": ("VARCHAR", "CASE WHEN stats_type = 'varchar' THEN statistics_min END"),
+    "max_varchar": ("VARCHAR", "CASE WHEN stats_type = 'varchar' THEN statistics_max END"),
+}
+
+
+# Per-partition totals, recomputed from parquet_files for the partitions a write touched.
+PARTITION_ROLLUP_SQL = """
+    SELECT table_name, region, eod_date, COUNT(*) AS file_count, SUM(num_rows) AS total_rows,
+           SUM(file_size) AS total_bytes, MAX(last_updated) AS last_updated
+    FROM parquet_files
+"""
+
+
+def create_metadata_schema(con):
+    """
+    One row per file in ``parquet_files`` and one row per file × row group ×
+    column in ``parquet_column_stats``. ``parquet_partitions`` is a compact
+    catalog with one row per table × region × EOD date, kept in step with every
+    write, for date/region lookups that should not touch per-file or per-column
+    rows. ``parquet_file_metadata`` is kept as a read-only view with the
+    original flat column layout.
+    """
+    legacy = con.execute("""
+        SELECT table_type FROM information_schema.tables WHERE table_name = 'parquet_file_metadata'
+    """).fetchone()
+    if legacy and legacy[0] == "BASE TABLE":
+        # The old flat table keyed on file_name alone could hold one stats row
+        # per file; keep it aside and let the next run re-ingest.
+        con.execute("ALTER TABLE parquet_file_metadata RENAME TO parquet_file_metadata_legacy;")
+        print("⚠️ Moved old parquet_file_metadata to parquet_file_metadata_legacy; files will be re-ingested.")
+
     con.execute("""
-    CREATE TABLE IF NOT EXISTS parquet_file_metadata (
-        table_name TEXT,
+    CREATE TABLE IF NOT EXISTS parquet_files (
         file_name TEXT PRIMARY KEY,
+        table_name TEXT,
+        region TEXT,
+        eod_date TEXT,
         file_size BIGINT,
+        last_modified TIMESTAMP,
+        etag TEXT,
+        num_rows BIGINT,
+        num_row_groups INTEGER,
+        last_updated TIMESTAMP
+    );
+    """)
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS parquet_column_stats (
+        file_name TEXT,
         row_group INTEGER,
         column_name TEXT,
+        row_group_num_rows BIGINT,
         physical_type TEXT,
         logical_type TEXT,
         num_values BIGINT,
+        null_count BIGINT,
         compression TEXT,
+        total_compressed_size BIGINT,
         statistics_min TEXT,
         statistics_max TEXT,
+        stats_type TEXT,
+        min_double DOUBLE,
+        max_double DOUBLE,
+        min_bigint BIGINT,
+        max_bigint BIGINT,
+        min_date DATE,
+        max_date DATE,
+        min_varchar VARCHAR,
+        max_varchar VARCHAR,
+        PRIMARY KEY (file_name, row_group, column_name)
+    );
+    """)
+    has_typed = con.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_name = 'parquet_column_stats' AND column_name = 'stats_type'
+    """).fetchone()[0]
+    if not has_typed:
+        # Stats tables created before typed bounds: add the columns and backfill once.
+        con.execute("ALTER TABLE parquet_column_stats ADD COLUMN stats_type TEXT;")
+        for col, (sql_type, _) in TYPED_BOUNDS.items():
+            con.execute(f"ALTER TABLE parquet_column_stats ADD COLUMN IF NOT EXISTS {col} {sql_type};")
+        con.execute(f"UPDATE parquet_column_stats SET stats_type = {STATS_TYPE_SQL};")
+        assignments = ", ".join(f"{col} = {expr}" for col, (_, expr) in TYPED_BOUNDS.items())
+        con.execute(f"UPDATE parquet_column_stats SET {assignments};")
+
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS parquet_partitions (
+        table_name TEXT,
         region TEXT,
         eod_date TEXT,
-        last_updated TIMESTAMP
+        file_count BIGINT,
+        total_rows BIGINT,
+        total_bytes BIGINT,
+        last_updated TIMESTAMP,
+        PRIMARY KEY (table_name, region, eod_date)
     );
     """)
-    return con
+    catalog_empty = con.execute("SELECT COUNT(*) = 0 FROM parquet_partitions").fetchone()[0]
+    if catalog_empty:
+        # Databases ingested before the catalog existed: build it once from parquet_files.
+        con.execute(f"INSERT INTO parquet_partitions {PARTITION_ROLLUP_SQL} GROUP BY table_name, region, eod_date;")
+
+    zone_maps_exist = con.execute("""
+        SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'parquet_zone_maps'
+    """).fetchone()[0]
+    bound_columns = ",\n        ".join(f"{col} {sql_type}" for col, (sql_type, _) in TYPED_BOUNDS.items())
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS parquet_row_groups (
+        table_name TEXT,
+        region TEXT,
+        eod_date TEXT,
+        file_name TEXT,
+        row_group INTEGER,
+        first_row BIGINT,
+        num_rows BIGINT
+    );
+    """)
+    con.execute(f"""
+    CREATE TABLE IF NOT EXISTS parquet_zone_maps (
+        table_name TEXT,
+        column_name TEXT,
+        eod_date TEXT,
+        file_name TEXT,
+        row_group INTEGER,
+        stats_type TEXT,
+        {bound_columns}
+    );
+    """)
+    if not zone_maps_exist:
+        # Databases ingested before the pruning index existed: derive it once from the stats.
+        _insert_zone_maps(con, """
+            SELECT f.table_name, f.region, f.eod_date, s.*
+            FROM parquet_column_stats s JOIN parquet_files f USING (file_name)
+        """)
+        cluster_zone_maps(con)
+
+    # Stats written when every BYTE_ARRAY counted as varchar: drop the bounds of
+    # un-annotated binaries, and bump their tables' version so engines rebuild.
+    mistyped = con.execute(f"""
+        SELECT DISTINCT f.table_name FROM parquet_column_stats s JOIN parquet_files f USING (file_name)
+        WHERE s.stats_type = 'varchar' AND NOT COALESCE({STRING_TYPE_SQL}, false)
+    """).fetchall()
+    if mistyped:
+        con.execute(f"""
+            UPDATE parquet_column_stats SET stats_type = NULL, min_varchar = NULL, max_varchar = NULL
+            WHERE stats_type = 'varchar' AND NOT COALESCE({STRING_TYPE_SQL}, false);
+        """)
+        con.execute("""
+            UPDATE parquet_zone_maps z SET stats_type = NULL, min_varchar = NULL, max_varchar = NULL
+            FROM parquet_column_stats s
+            WHERE z.stats_type = 'varchar' AND s.stats_type IS NULL
+              AND s.file_name = z.file_name AND s.row_group = z.row_group AND s.column_name = z.column_name;
+        """)
+        con.execute("UPDATE parquet_partitions SET last_updated = now() WHERE table_name IN (SELECT unnest($1));",
+                    [[t for t, in mistyped]])
+
+    con.execute("""
+    CREATE OR REPLACE VIEW parquet_file_metadata AS
+    SELECT f.table_name, f.file_name, f.file_size, s.row_group, s.column_name,
+           s.physical_type, s.logical_type, s.num_values, s.compression,
+           s.statistics_min, s.statistics_max, f.region, f.eod_date, f.last_updated,
+           f.last_modified, f.etag
+    FROM parquet_files f
+    JOIN parquet_column_stats s USING (file_name);
+    """)
+
+
+# --- LISTING ---
+LISTING_COLUMNS = ["file_name", "file_size", "last_modified", "etag"]
+PARTITION_PATTERN = r"/([^/]+)/region=([^/]+)/eod_date=(\d{4}-\d{2}-\d{2})/"
+
+
+def _s3_client():
+    return boto3.client(
+        "s3", region_name=S3_REGION,
+        aws_access_key_id=S3_ACCESS_KEY, aws_secret_access_key=S3_SECRET_KEY,
+    )
+
+
+def _s3_subprefixes(client, bucket, key_prefix):
+    """Immediate "directories" under a key prefix (paginated, delimiter '/')."""
+    prefixes = []
+    for page in client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=key_prefix, Delimiter="/"):
+        prefixes += [p["Prefix"] for p in page.get("CommonPrefixes", [])]
+    return prefixes
+
+
+def _list_s3_objects(prefix, client=None):
+    bucket, _, key_prefix = prefix[len("s3://"):].partition("/")
+    client = client or _s3_client()
+    rows = []
+    for page in client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=key_prefix):
+        for obj in page.get("Contents", []):
+            if obj["Key"].endswith(".parquet"):
+                rows.append((f"s3://{bucket}/{obj['Key']}", obj["Size"], obj["LastModified"], obj["ETag"].strip('"')))
+    return pd.DataFrame(rows, columns=LISTING_COLUMNS)
+
+
+def _list_s3_tree(root, max_workers):
+    """
+    List everything under ``root`` once: table and region prefixes are found
+    with delimiter listings, then each table/region prefix is paginated on its
+    own thread (boto3 clients are thread-safe).
+    """
+    client = _s3_client()
+    bucket, _, key_prefix = root[len("s3://"):].rstrip("/").partition("/")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        tables = _s3_subprefixes(client, bucket, f"{key_prefix}/")
+        regions = pool.map(lambda t: _s3_subprefixes(client, bucket, t), tables)
+        prefixes = [f"s3://{bucket}/{r}" for rs in regions for r in rs]
+        frames = list(pool.map(lambda p: _list_s3_objects(p, client), prefixes))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=LISTING_COLUMNS)
+
+
+def _annotate_partitions(files_df):
+    """Parse table / region / eod_date out of Hive paths and normalize last-modified to naive UTC."""
+    files_df["last_modified"] = pd.to_datetime(files_df["last_modified"], utc=True).dt.tz_localize(None)
+    parts = files_df["file_name"].str.extract(PARTITION_PATTERN)
+    files_df["table_name"], files_df["region"], files_df["eod_date"] = parts[0], parts[1], parts[2]
+    return files_df
+
+
+def list_lake_files(con, prefix, eod_date=None):
+    """
+    List every Parquet file under a table ``prefix`` (optionally one EOD date)
+    with its change signals. S3 prefixes use a paginated ListObjectsV2 (size,
+    last-modified, ETag) when boto3 is available; otherwise DuckDB's
+    read_blob() supplies size and last-modified without reading file contents.
+    """
+    if prefix.startswith("s3://") and boto3 is not None:
+        files_df = _list_s3_objects(prefix)
+    else:
+        date_dir = f"eod_date={eod_date}" if eod_date else "eod_date=*"
+        files_df = con.execute(f"""
+            SELECT filename AS file_name, size AS file_size, last_modified, NULL::VARCHAR AS etag
+            FROM read_blob('{prefix.rstrip("/")}/region=*/{date_dir}/*.parquet')
+        """).df()
+    files_df = _annotate_partitions(files_df)
+    if eod_date:
+        files_df = files_df[files_df["eod_date"] == eod_date]
+    return files_df
+
+
+def list_lake(con, root=S3_BUCKET_ROOT, max_workers=LIST_WORKERS):
+    """
+    One listing of the whole lake, with the same columns as list_lake_files()
+    plus table_name. On S3 with boto3 it is paginated in parallel per
+    table/region prefix; otherwise a single recursive read_blob() glob.
+    """
+    if root.startswith("s3://") and boto3 is not None:
+        files_df = _list_s3_tree(root, max_workers)
+    else:
+        files_df = con.execute(f"""
+            SELECT filename AS file_name, size AS file_size, last_modified, NULL::VARCHAR AS etag
+            FROM read_blob('{root.rstrip("/")}/*/region=*/eod_date=*/*.parquet')
+        """).df()
+    return _annotate_partitions(files_df).dropna(subset=["eod_date"])
+
+
+def build_partition_tree(listing):
+    """
+    Nest a lake listing as {table: {region: {eod_date: files}}}, where ``files``
+    is that partition's slice of the listing (file_name, file_size and change
+    signals). Discovery and ingest read from the tree instead of re-listing.
+    """
+    tree = {}
+    for (table, region, eod_date), files in listing.groupby(["table_name", "region", "eod_date"], sort=True):
+        tree.setdefault(table, {}).setdefault(region, {})[eod_date] = files.reset_index(drop=True)
+    return tree
+
+
+def partition_files(tree, table, eod_date=None):
+    """All listed files of a table (optionally one EOD date) across regions."""
+    frames = [
+        files
+        for dates in tree.get(table, {}).values()
+        for date, files in dates.items()
+        if eod_date is None or date == eod_date
+    ]
+    if not frames:
+        return pd.DataFrame(columns=LISTING_COLUMNS + ["table_name", "region", "eod_date"])
+    return pd.concat(frames, ignore_index=True)
+
+
+# --- PRUNING INDEX ---
+# parquet_row_groups (one row per file × row group: its partition and row range)
+# and parquet_zone_maps (typed min/max per file × row group × column) are what
+# SmartQueryEngine loads into its in-memory pruning index. Ingest appends them
+# batch by batch; cluster_zone_maps() rewrites them in index order so DuckDB's
+# own storage zone maps skip everything outside a (table, column, date) slice.
+ROW_GROUP_ORDER = "table_name, eod_date, file_name, row_group"
+ZONE_MAP_ORDER = "table_name, column_name, eod_date, file_name, row_group"
+
+
+def _insert_zone_maps(con, stats_sql, params=None):
+    """Append index rows for ``stats_sql``: parquet_column_stats rows plus table_name, region and eod_date."""
+    bounds = ", ".join(TYPED_BOUNDS)
+    con.execute(f"""
+        INSERT INTO parquet_row_groups BY NAME
+        SELECT table_name, region, eod_date, file_name, row_group,
+               (SUM(num_rows) OVER (PARTITION BY file_name ORDER BY row_group) - num_rows)::BIGINT AS first_row,
+               num_rows
+        FROM (
+            SELECT DISTINCT table_name, region, eod_date, file_name, row_group, row_group_num_rows AS num_rows
+            FROM ({stats_sql})
+        )
+        ORDER BY {ROW_GROUP_ORDER};
+    """, params)
+    con.execute(f"""
+        INSERT INTO parquet_zone_maps BY NAME
+        SELECT table_name, column_name, eod_date, file_name, row_group, stats_type, {bounds}
+        FROM ({stats_sql})
+        ORDER BY {ZONE_MAP_ORDER};
+    """, params)
+
+
+def cluster_zone_maps(con):
+    """Rewrite the pruning index tables sorted by table, (column,) date, file and row group."""
+    con.execute(f"CREATE OR REPLACE TABLE parquet_row_groups AS SELECT * FROM parquet_row_groups ORDER BY {ROW_GROUP_ORDER};")
+    con.execute(f"CREATE OR REPLACE TABLE parquet_zone_maps AS SELECT * FROM parquet_zone_maps ORDER BY {ZONE_MAP_ORDER};")
 
 
 # --- DISCOVERY HELPERS ---
-def discover_tables(con):
-    df = con.execute(f"SELECT file FROM glob('{S3_BUCKET_ROOT}/*')").df()
-    df["table_name"] = df["file"].str.extract(r"hive_data/([^/]+)")
-    return df["table_name"].dropna().unique().tolist()
+def discover_tables(tree):
+    return sorted(tree)
 
 
-def discover_s3_eod_dates(con, table):
-    path = f"{S3_BUCKET_ROOT}/{table}/region=*/eod_date=*/"
-    df = con.execute(f"SELECT file FROM glob('{path}')").df()
-    df["eod_date"] = df["file"].str.extract(r"eod_date=(\\d{4}-\\d{2}-\\d{2})")
-    return sorted(df["eod_date"].dropna().unique().tolist())
+def discover_s3_eod_dates(tree, table):
+    return sorted({date for dates in tree.get(table, {}).values() for date in dates})
 
 
 def discover_existing_eod_dates(con, table):
-    df = con.execute(f"SELECT DISTINCT eod_date FROM parquet_file_metadata WHERE table_name='{table}'").df()
+    df = con.execute("SELECT DISTINCT eod_date FROM parquet_partitions WHERE table_name=$1", [table]).df()
     return sorted(df["eod_date"].dropna().unique().tolist())
 
 
+def diff_listing(listed, tracked):
+    """
+    Compare a listing against tracked files (both keyed by file_name) and return
+    (added_or_changed, removed). A file counts as changed when its size differs,
+    or its last-modified / ETag differs where both sides have one.
+    """
+    merged = listed.merge(tracked, on="file_name", how="outer", suffixes=("", "_tracked"), indicator=True)
+    both = merged["_merge"] == "both"
+    changed = both & (
+        (merged["file_size"] != merged["file_size_tracked"])
+        | (merged["last_modified"].notna() & merged["last_modified_tracked"].notna()
+           & (merged["last_modified"] != merged["last_modified_tracked"]))
+        | (merged["etag"].notna() & merged["etag_tracked"].notna()
+           & (merged["etag"] != merged["etag_tracked"]))
+    )
+    added_or_changed = merged[(merged["_merge"] == "left_only") | changed][listed.columns]
+    removed = merged[merged["_merge"] == "right_only"]["file_name"].tolist()
+    return added_or_changed, removed
+
+
+def tracked_files(con, table, eod_date=None):
+    return con.execute("""
+        SELECT file_name, file_size, last_modified, etag
+        FROM parquet_files WHERE table_name=$1 AND ($2 IS NULL OR eod_date=$2)
+    """, [table, eod_date]).df()
+
+
 # --- CORE UPDATE ---
-def update_metadata_for_table_date(con, table, eod_date):
-    path = f"{S3_BUCKET_ROOT}/{table}/region=*/eod_date={eod_date}/*.parquet"
-    print(f"📅 Updating {table} for {eod_date} ...")
+# Serializes metadata writes: ingest workers stage on their own cursors in
+# parallel but commit one at a time, so writers never contend on the same keys.
+_write_lock = threading.Lock()
 
-    files_df = con.execute(f"SELECT file AS file_name, size AS file_size FROM glob('{path}')").df()
-    if files_df.empty:
-        print("⚠️ No files found.")
-        return
 
-    existing = con.execute(
-        f"SELECT file_name, file_size FROM parquet_file_metadata WHERE table_name='{table}' AND eod_date='{eod_date}'"
-    ).df()
+def stage_metadata_for_table_date(con, table, eod_date, new_files=None):
+    """
+    Read-only half of an update: list the date's files, diff them against the
+    tracked listing signals and read Parquet metadata for new/changed files
+    into TEMP tables ``stage_files`` / ``stage_stats`` on ``con``. The stats
+    rows stay inside DuckDB; only the per-file listing passes through pandas.
+    ``new_files`` skips the listing when the caller already has the files from
+    the partition tree.
+    Returns the number of staged files, or None when nothing changed.
+    """
+    print(f"📅 Updating {table} for {eod_date} ...")
 
-    merged = files_df.merge(existing, on="file_name", how="left", suffixes=("", "_existing"))
-    new_files = merged[
-        merged["file_size_existing"].isna() | (merged["file_size"] != merged["file_size_existing"])
-    ][["file_name", "file_size"]]
+    if new_files is None:
+        files_df = list_lake_files(con, f"{S3_BUCKET_ROOT}/{table}", eod_date)
+        if files_df.empty:
+            print(f"⚠️ No files found for {table} - {eod_date}.")
+            return None
+        new_files, _ = diff_listing(files_df, tracked_files(con, table, eod_date))
 
     if new_files.empty:
-        print("✅ No new or changed files.")
-        return
+        print(f"✅ No new or changed files for {table} - {eod_date}.")
+        return None
+
+    print(f"🆕 Found {len(new_files)} new/updated files for {table} - {eod_date}.")
+    con.register("listed_files", new_files[LISTING_COLUMNS])
+    con.execute("CREATE OR REPLACE TEMP TABLE stage_files AS SELECT * FROM listed_files;")
+    con.unregister("listed_files")
+
+    stats_query = f"""
+        SELECT m.file_name, m.row_group_id AS row_group, m.path_in_schema AS column_name,
+               m.row_group_num_rows, m.type AS physical_type,
+               COALESCE(s.logical_type, s.converted_type) AS logical_type,
+               m.num_values, m.stats_null_count AS null_count, m.compression,
+               m.total_compressed_size,
+               COALESCE(m.stats_min_value, m.stats_min) AS statistics_min,
+               COALESCE(m.stats_max_value, m.stats_max) AS statistics_max
+        FROM parquet_metadata($files) m
+        LEFT JOIN parquet_schema($files) s
+          ON s.file_name = m.file_name AND s.name = m.path_in_schema
+    """
+    typed_bounds = ",\n               ".join(f"{expr} AS {col}" for col, (_, expr) in TYPED_BOUNDS.items())
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE stage_stats AS
+        WITH chunks AS ({stats_query}),
+        typed AS (SELECT *, {STATS_TYPE_SQL} AS stats_type FROM chunks)
+        SELECT *,
+               {typed_bounds}
+        FROM typed;
+    """, {"files": new_files["file_name"].tolist()})
+    return len(new_files)
+
+
+def write_metadata(con, table, eod_date):
+    """
+    Bulk upsert the batch staged on ``con`` in one transaction: each file's
+    row-group × column stats are swapped wholesale (so row groups that
+    disappeared in a rewrite do not linger) and the file rows, with row
+    counts, region and timestamp derived in SQL, are replaced by key.
+    Returns (files, column stats) written.
+    """
+    with _write_lock:
+        con.execute("BEGIN TRANSACTION;")
+        try:
+            _upsert_staged(con, table, eod_date)
+        except Exception:
+            con.execute("ROLLBACK;")
+            raise
+        con.execute("COMMIT;")
+    counts = con.execute("SELECT (SELECT COUNT(*) FROM stage_files), (SELECT COUNT(*) FROM stage_stats)").fetchone()
+    con.execute("DROP TABLE IF EXISTS stage_files; DROP TABLE IF EXISTS stage_stats;")
+    return counts
+
+
+def _upsert_staged(con, table, eod_date):
+    for index_table in ("parquet_column_stats", "parquet_row_groups", "parquet_zone_maps"):
+        con.execute(f"DELETE FROM {index_table} WHERE file_name IN (SELECT file_name FROM stage_files);")
+    con.execute("INSERT INTO parquet_column_stats BY NAME SELECT * FROM stage_stats;")
+    _insert_zone_maps(con, """
+        SELECT $table AS table_name, regexp_extract(file_name, 'region=([^/]+)', 1) AS region,
+               $eod_date AS eod_date, *
+        FROM stage_stats
+    """, {"table": table, "eod_date": eod_date})
+    con.execute("""
+        INSERT OR REPLACE INTO parquet_files BY NAME
+        SELECT l.file_name, $table AS table_name,
+               regexp_extract(l.file_name, 'region=([^/]+)', 1) AS region,
+               $eod_date AS eod_date, l.file_size, l.last_modified, l.etag,
+               COALESCE(r.num_rows, 0) AS num_rows, COALESCE(r.num_row_groups, 0) AS num_row_groups,
+               timezone('UTC', now()) AS last_updated
+        FROM stage_files l
+        LEFT JOIN (
+            SELECT file_name, SUM(row_group_num_rows) AS num_rows, COUNT(*) AS num_row_groups
+            FROM (SELECT DISTINCT file_name, row_group, row_group_num_rows FROM stage_stats)
+            GROUP BY file_name
+        ) r USING (file_name);
+    """, {"table": table, "eod_date": eod_date})
+    refresh_partitions(con, "SELECT DISTINCT table_name, region, eod_date FROM parquet_files "
+                            "WHERE file_name IN (SELECT file_name FROM stage_files)")
+
+
+def refresh_partitions(con, touched_sql):
+    """
+    Recompute the parquet_partitions rows for the partitions returned by
+    ``touched_sql`` (table_name, region, eod_date) from their parquet_files rows;
+    partitions left without files are dropped. Runs inside the caller's transaction.
+    """
+    con.execute(f"CREATE OR REPLACE TEMP TABLE touched_partitions AS {touched_sql};")
+    con.execute("""
+        DELETE FROM parquet_partitions p USING touched_partitions t
+        WHERE p.table_name = t.table_name AND p.region = t.region AND p.eod_date = t.eod_date;
+    """)
+    con.execute(f"""
+        INSERT INTO parquet_partitions
+        {PARTITION_ROLLUP_SQL}
+        WHERE (table_name, region, eod_date) IN (SELECT table_name, region, eod_date FROM touched_partitions)
+        GROUP BY table_name, region, eod_date;
+    """)
+    con.execute("DROP TABLE touched_partitions;")
+
+
+def remove_metadata(con, file_names):
+    con.register("removed_files", pd.DataFrame({"file_name": file_names}))
+    with _write_lock:
+        con.execute("BEGIN TRANSACTION;")
+        con.execute("""
+            CREATE OR REPLACE TEMP TABLE removed_partitions AS
+            SELECT DISTINCT table_name, region, eod_date FROM parquet_files
+            WHERE file_name IN (SELECT file_name FROM removed_files);
+        """)
+        for metadata_table in ("parquet_column_stats", "parquet_row_groups", "parquet_zone_maps", "parquet_files"):
+            con.execute(f"DELETE FROM {metadata_table} WHERE file_name IN (SELECT file_name FROM removed_files);")
+        refresh_partitions(con, "SELECT * FROM removed_partitions")
+        con.execute("DROP TABLE removed_partitions;")
+        con.execute("COMMIT;")
+    con.unregister("removed_files")
+
+
+def update_metadata_for_table_date(con, table, eod_date, new_files=None):
+    if stage_metadata_for_table_date(con, table, eod_date, new_files) is None:
+        return None
+    num_files, num_stats = write_metadata(con, table, eod_date)
+    print(f"✅ Updated {num_files} files / {num_stats} column stats for {table} - {eod_date}")
+    return num_files, num_stats
+
+
+def plan_reconciliation(con, table, tree):
+    """
+    Diff the table's files in the lake ``tree`` against everything tracked for it.
+    Returns (work_items, removed) where work_items are (table, eod_date, new_files)
+    for every date with added/changed files.
+    """
+    listed = partition_files(tree, table)[LISTING_COLUMNS + ["eod_date"]]
+    added_or_changed, removed = diff_listing(listed, tracked_files(con, table))
+    work_items = [
+        (table, eod_date, new_files)
+        for eod_date, new_files in added_or_changed.groupby("eod_date", sort=True)
+    ]
+    return work_items, removed
 
-    print(f"🆕 Found {len(new_files)} new/updated files.")
-    file_list = ", ".join([f"'{f}'" for f in new_files["file_name"].tolist()])
 
-    meta_query = f"""
-        SELECT file_name, file_size, row_group, column_name,
-               physical_type, logical_type, num_values, compression,
-               statistics_min, statistics_max
-        FROM parquet_metadata(ARRAY[{file_list}]);
+def ingest_concurrently(con, work_items, max_workers=INGEST_WORKERS):
     """
-    meta_df = con.execute(meta_query).df()
-    meta_df["table_name"] = table
-    meta_df["region"] = meta_df["file_name"].str.extract(r'region=([^/]+)')
-    meta_df["eod_date"] = eod_date
-    meta_df["last_updated"] = datetime.utcnow()
+    Fan (table, eod_date, new_files) work items out over a pool of cursors:
+    footer reads overlap, and each worker commits its staged
+    batch through write_metadata(), which admits one writer at a time.
+    """
+    cursors = Queue()
+    for _ in range(max_workers):
+        cur = con.cursor()
+        configure_s3(cur)
+        cursors.put(cur)
+
+    def ingest(table, eod_date, new_files):
+        cur = cursors.get()
+        try:
+            return update_metadata_for_table_date(cur, table, eod_date, new_files)
+        finally:
+            cursors.put(cur)
 
-    con.register("meta_new", meta_df)
-    con.execute("INSERT OR REPLACE INTO parquet_file_metadata SELECT * FROM meta_new;")
-    print(f"✅ Updated {len(meta_df)} metadata rows for {table} - {eod_date}")
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(ingest, *item): item[:2] for item in work_items}
+        for future in as_completed(futures):
+            table, eod_date = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ {table} - {eod_date} failed: {e}")
+                failed.append((table, eod_date))
+
+    while not cursors.empty():
+        cursors.get().close()
+    return failed
 
 
 # --- ORCHESTRATOR ---
-def auto_update_all_metadata():
+def auto_update_all_metadata(max_workers=INGEST_WORKERS, reconcile=False):
     con = connect_duckdb()
-    tables = discover_tables(con)
+    tree = build_partition_tree(list_lake(con))
+    tables = discover_tables(tree)
     print(f"📦 Discovered tables: {tables}")
 
+    work_items, removed_any = [], False
     for table in tables:
-        s3_dates = discover_s3_eod_dates(con, table)
+        if reconcile:
+            table_items, removed = plan_reconciliation(con, table, tree)
+            if removed:
+                remove_metadata(con, removed)
+                removed_any = True
+                print(f"🗑️ {table}: Removed metadata for {len(removed)} deleted files.")
+            if not table_items:
+                print(f"✅ {table}: No added or changed files.")
+                continue
+            print(f"🔁 {table}: {sum(len(f) for _, _, f in table_items)} added/changed files "
+                  f"across {len(table_items)} dates → {[d for _, d, _ in table_items]}")
+            work_items += table_items
+            continue
+
+        s3_dates = discover_s3_eod_dates(tree, table)
         existing_dates = discover_existing_eod_dates(con, table)
         missing_dates = sorted(list(set(s3_dates) - set(existing_dates)))
 
@@ -129,11 +670,35 @@ def auto_update_all_metadata():
             continue
 
         print(f"📈 {table}: Found {len(missing_dates)} new dates → {missing_dates}")
-        for eod_date in missing_dates:
-            update_metadata_for_table_date(con, table, eod_date)
+        # Nothing is tracked for a missing date, so every listed file is new.
+        work_items += [
+            (table, eod_date, partition_files(tree, table, eod_date)[LISTING_COLUMNS])
+            for eod_date in missing_dates
+        ]
+
+    if max_workers > 1 and len(work_items) > 1:
+        print(f"⚙️ Ingesting {len(work_items)} table×date items on {max_workers} workers ...")
+        failed = ingest_concurrently(con, work_items, max_workers)
+        if failed:
+            print(f"⚠️ {len(failed)} items failed and will be retried on the next run: {failed}")
+    else:
+        for table, eod_date, new_files in work_items:
+            update_metadata_for_table_date(con, table, eod_date, new_files)
 
+    if work_items or removed_any:
+        cluster_zone_maps(con)
+        print("🗂️ Re-clustered the pruning index.")
+    if work_items or removed_any or published_snapshot(DUCKDB_FILE) is None:
+        # Query engines read this copy, so they never contend for the writer's lock.
+        print(f"📸 Published read-only snapshot {publish_snapshot(con, DUCKDB_FILE)}")
     print("\n🎯 Metadata fully synchronized!")
 
 
 if __name__ == "__main__":
-    auto_update_all_metadata()
+    parser = argparse.ArgumentParser(description="Incrementally sync Parquet metadata for the Hive lake.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="concurrent table×date ingest workers (1 = sequential)")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="re-check already tracked dates for added, changed and deleted files")
+    args = parser.parse_args()
+    auto_update_all_metadata(max_workers=args.workers, reconcile=args.reconcile)
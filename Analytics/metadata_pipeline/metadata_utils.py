@@ -5,18 +5,36 @@ Utility helpers for inspecting metadata health and volume.
 """
 
 import duckdb
-import pandas as pd
+
+def ensure_extension(con, name):
+    """
+    LOAD an extension, running INSTALL only when it is not installed yet, so a
+    warm start does not touch the extension repository.
+    """
+    row = con.execute(
+        "SELECT installed, loaded FROM duckdb_extensions() WHERE extension_name = $1", [name]
+    ).fetchone()
+    if row is None or not row[0]:
+        con.execute(f"INSTALL {name};")
+    if row is None or not row[1]:
+        con.execute(f"LOAD {name};")
+
+# (latest last_updated, file count) of a table in the loader's partition catalog;
+# any ingest or removal changes it.
+TABLE_VERSION_SQL = "SELECT MAX(last_updated), SUM(file_count)::BIGINT FROM parquet_partitions WHERE table_name=$1"
+
+def fetch_arrow(result):
+    return result.to_arrow_table() if hasattr(result, "to_arrow_table") else result.fetch_arrow_table()
 
 def summarize_metadata(con):
     return con.execute("""
         SELECT table_name, region, eod_date,
-               COUNT(DISTINCT file_name) AS num_files,
-               SUM(num_values) AS total_rows
-        FROM parquet_file_metadata
-        GROUP BY table_name, region, eod_date
+               file_count AS num_files,
+               total_rows, total_bytes
+        FROM parquet_partitions
         ORDER BY eod_date DESC;
     """).df()
 
 def list_tracked_dates(con, table_name):
-    df = con.execute(f"SELECT DISTINCT eod_date FROM parquet_file_metadata WHERE table_name='{table_name}' ORDER BY eod_date").df()
+    df = con.execute("SELECT DISTINCT eod_date FROM parquet_partitions WHERE table_name=$1 ORDER BY eod_date", [table_name]).df()
     print(df)
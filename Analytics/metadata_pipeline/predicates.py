@@ -0,0 +1,283 @@
+"""
+predicates.py
+---------------------------------------------------------
+Pruning predicates accepted by SmartQueryEngine's ``column_filter``.
+
+A predicate is one of:
+  (column, op, value)       one comparison: =, !=, <, <=, >, >=, BETWEEN
+                            (value is a (low, high) pair) or IN (value is a list);
+                            [column, op, value] is read the same way
+  [p1, p2, ...]             all of them (AND)
+  {"and": [p1, p2, ...]}    all of them
+  {"or": [p1, p2, ...]}     any of them
+nested to any depth, e.g.
+  [("sales_amount", ">", 1000),
+   {"or": [("qty", "IN", [1, 2]), ("order_date", "BETWEEN", ("2025-10-01", "2025-10-07"))]}]
+
+Every comparison is checked against a row group's min/max stats on its own
+column; AND intersects and OR unions the row groups that may match, so a row
+group is skipped only when none of its rows can satisfy the whole predicate.
+
+from_sql_filter() derives such a predicate from a SQL WHERE clause, so a
+``sql_filter`` prunes files and row groups without being repeated in
+``column_filter``.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import duckdb
+
+OPS = {"=", "!=", "<>", "<", "<=", ">", ">=", "BETWEEN", "IN"}
+
+# json_serialize_sql() comparison types -> op, and the op with its sides swapped.
+SQL_COMPARISONS = {
+    "COMPARE_EQUAL": "=", "COMPARE_NOTEQUAL": "!=",
+    "COMPARE_LESSTHAN": "<", "COMPARE_LESSTHANOREQUALTO": "<=",
+    "COMPARE_GREATERTHAN": ">", "COMPARE_GREATERTHANOREQUALTO": ">=",
+}
+FLIPPED = {"=": "=", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+INT64_RANGE = (-2**63, 2**63 - 1)
+
+
+def _is_comparison(items):
+    return (len(items) == 3 and isinstance(items[0], str) and isinstance(items[1], str)
+            and items[1].strip().upper() in OPS)
+
+
+def normalize(predicate):
+    """
+    Canonical, hashable form of a predicate: (column, OP, value) leaves and
+    ("AND" | "OR", (children, ...)) groups, with nested groups of the same
+    kind flattened. Returns None for no predicate (or an empty AND).
+    """
+    if predicate is None:
+        return None
+    if isinstance(predicate, list) and _is_comparison(predicate):
+        predicate = tuple(predicate)  # a comparison written as a list, as column_filter always accepted
+    if isinstance(predicate, tuple) and len(predicate) == 3:
+        col, op, val = predicate
+        op = op.strip().upper()
+        if op not in OPS:
+            raise ValueError(f"Unsupported pruning operator: {op}")
+        if op == "BETWEEN" and len(val) != 2:
+            raise ValueError(f"BETWEEN on {col} needs a (low, high) pair, got {val!r}")
+        if isinstance(val, (list, tuple, set)):
+            val = tuple(sorted(val, key=repr)) if isinstance(val, set) else tuple(val)
+        return col, op, val
+    if isinstance(predicate, dict):
+        if len(predicate) != 1 or next(iter(predicate)).lower() not in ("and", "or"):
+            raise ValueError(f"Predicate groups are {{'and': [...]}} or {{'or': [...]}}, got {predicate!r}")
+        kind, children = next(iter(predicate.items()))
+        kind = kind.upper()
+    elif isinstance(predicate, list):
+        kind, children = "AND", predicate
+    elif isinstance(predicate, tuple) and len(predicate) == 2 and predicate[0] in ("AND", "OR"):
+        kind, children = predicate  # already normalized
+    else:
+        raise ValueError(f"Not a pruning predicate: {predicate!r}")
+
+    flat = []
+    for child in map(normalize, children):
+        if child is None:
+            continue
+        flat.extend(child[1] if len(child) == 2 and child[0] == kind else [child])
+    if not flat:
+        if kind == "OR":
+            raise ValueError("An 'or' predicate needs at least one branch")
+        return None
+    return flat[0] if len(flat) == 1 else (kind, tuple(flat))
+
+
+def predicate_columns(predicate):
+    """Columns a normalized predicate compares, in first-mention order."""
+    if predicate is None:
+        return []
+    if len(predicate) == 3:
+        return [predicate[0]]
+    columns = []
+    for child in predicate[1]:
+        columns += [c for c in predicate_columns(child) if c not in columns]
+    return columns
+
+
+def evaluate(predicate, leaf):
+    """
+    Combine per-comparison masks over a normalized predicate. ``leaf(column,
+    op, value)`` returns a boolean mask of row groups that may match, or None
+    when the comparison cannot prune (no usable stats); the result is None
+    when nothing can be pruned.
+    """
+    if len(predicate) == 3:
+        return leaf(*predicate)
+    kind, children = predicate
+    combined = None
+    for child in children:
+        mask = evaluate(child, leaf)
+        if kind == "AND":
+            if mask is not None:
+                combined = mask if combined is None else combined & mask
+        elif mask is None:
+            return None  # one branch keeps everything, so the OR does too
+        else:
+            combined = mask if combined is None else combined | mask
+    return combined
+
+
+def _group(kind, children):
+    """AND keeps the branches it could translate; OR is only usable when every branch was."""
+    if kind == "AND":
+        children = [c for c in children if c is not None]
+        return (kind, children) if children else None
+    return None if any(c is None for c in children) else (kind, children)
+
+
+def _is_constant(expr):
+    if expr["class"] == "CONSTANT":
+        return True
+    return expr["class"] == "CAST" and _is_constant(expr["child"])
+
+
+def _column(expr, columns):
+    if expr["class"] != "COLUMN_REF" or len(expr["column_names"]) != 1:
+        return None
+    return columns.get(expr["column_names"][0].lower())
+
+
+def _extract(expr, columns, constants):
+    """
+    Structure of the sargable part of a parsed WHERE clause: AND/OR groups
+    over (column, op, [constant positions]) leaves; the constant expressions
+    themselves are collected into ``constants`` to be evaluated in one go.
+    """
+    if expr is None:
+        return None
+
+    def leaf(col, op, consts):
+        constants.extend(consts)
+        return col, op, list(range(len(constants) - len(consts), len(constants)))
+
+    kind = expr["type"]
+    if kind in ("CONJUNCTION_AND", "CONJUNCTION_OR"):
+        return _group(kind[len("CONJUNCTION_"):], [_extract(c, columns, constants) for c in expr["children"]])
+    if kind in SQL_COMPARISONS:
+        op = SQL_COMPARISONS[kind]
+        left, right = expr["left"], expr["right"]
+        if _column(left, columns) and _is_constant(right):
+            return leaf(_column(left, columns), op, [right])
+        if _column(right, columns) and _is_constant(left):
+            return leaf(_column(right, columns), FLIPPED[op], [left])
+        return None
+    if kind == "COMPARE_BETWEEN":
+        col = _column(expr["input"], columns)
+        if col and _is_constant(expr["lower"]) and _is_constant(expr["upper"]):
+            return leaf(col, "BETWEEN", [expr["lower"], expr["upper"]])
+        return None
+    if kind == "COMPARE_IN":
+        col, values = _column(expr["children"][0], columns), expr["children"][1:]
+        if col and values and all(_is_constant(v) for v in values):
+            return leaf(col, "IN", values)
+        return None
+    return None
+
+
+def _stats_value(stats_type, value):
+    """``value`` as something the column's typed bounds compare against exactly, or None if unsafe."""
+    if value is None or isinstance(value, bool):
+        return None
+    if stats_type == "varchar":
+        return value if isinstance(value, str) else None
+    if stats_type in ("double", "bigint"):
+        if isinstance(value, int):
+            return value if INT64_RANGE[0] <= value <= INT64_RANGE[1] else float(value)
+        return float(value) if isinstance(value, (float, Decimal)) else None
+    if stats_type == "date":
+        if isinstance(value, datetime):
+            return None  # compared as a timestamp: a date's bounds cannot decide it
+        if isinstance(value, date):
+            return value
+        try:
+            return date.fromisoformat(value) if isinstance(value, str) else None
+        except ValueError:
+            return None
+    return None
+
+
+def _bind(tree, values, column_types):
+    if tree is None:
+        return None
+    if len(tree) == 2:
+        kind, children = tree
+        bound = _group(kind, [_bind(c, values, column_types) for c in children])
+        return {kind.lower(): bound[1]} if bound else None
+    col, op, positions = tree
+    converted = [_stats_value(column_types[col], values[i]) for i in positions]
+    if any(v is None for v in converted):
+        return None
+    if op == "BETWEEN":
+        return col, op, tuple(converted)
+    return (col, op, converted) if op == "IN" else (col, op, converted[0])
+
+
+def _parse(con, sql):
+    """json_serialize_sql() AST of a single statement, or None if it does not parse."""
+    parsed = json.loads(con.execute("SELECT json_serialize_sql($q)", {"q": sql}).fetchone()[0])
+    if parsed.get("error") or len(parsed["statements"]) != 1:
+        return None
+    return parsed
+
+
+def _column_refs(node, found):
+    if isinstance(node, dict):
+        if node.get("class") == "COLUMN_REF":
+            found.update(name.lower() for name in node["column_names"])
+        for child in node.values():
+            _column_refs(child, found)
+    elif isinstance(node, list):
+        for child in node:
+            _column_refs(child, found)
+    return found
+
+
+def referenced_names(con, expr):
+    """
+    Lower-cased names an SQL expression references as columns (every part of
+    a qualified name), as DuckDB's parser sees them; None if it does not parse.
+    """
+    try:
+        parsed = _parse(con, f"SELECT {expr}")
+    except duckdb.Error:
+        return None
+    return None if parsed is None else _column_refs(parsed["statements"], set())
+
+
+def from_sql_filter(con, sql_filter, column_types):
+    """
+    Pruning predicate implied by a SQL WHERE clause, or None. The clause is
+    parsed with DuckDB's json_serialize_sql(); comparisons, BETWEEN and IN
+    between a column of ``column_types`` ({column: stats type, None if it has
+    no usable stats}) and constants are kept, under the clause's AND/OR
+    structure. Anything else drops out of an AND and leaves an OR unprunable,
+    so the predicate never rules out a row the filter would return.
+    """
+    columns = {c.lower(): c for c, stats_type in column_types.items() if stats_type}
+    if not sql_filter or not columns:
+        return None
+    try:
+        parsed = _parse(con, f"SELECT 1 WHERE {sql_filter}")
+        if parsed is None:
+            return None
+        constants = []
+        tree = _extract(parsed["statements"][0]["node"]["where_clause"], columns, constants)
+        if tree is None:
+            return None
+        # Evaluate every constant (casts, typed literals, decimals) in one SELECT built from the same AST.
+        node = parsed["statements"][0]["node"]
+        node["select_list"], node["where_clause"] = constants, None
+        values = con.execute(con.execute(
+            "SELECT json_deserialize_sql($q)", {"q": json.dumps(parsed)}
+        ).fetchone()[0]).fetchone()
+    except duckdb.Error:
+        return None
+    return normalize(_bind(tree, values, column_types))
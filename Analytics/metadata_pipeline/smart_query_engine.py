@@ -4,44 +4,493 @@ smart_query_engine.py
 Optimized querying using DuckDB metadata pruning.
 """
 
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import duckdb
-import pandas as pd
+from datetime import date
+
+from connection_pool import shared_pool
+from local_file_cache import LOCAL_CACHE_BYTES, LocalFileCache, evict_lru, is_remote
+from metadata_utils import TABLE_VERSION_SQL, fetch_arrow
+from predicates import from_sql_filter, normalize, predicate_columns, referenced_names
 
 DUCKDB_FILE = "lake_metadata.duckdb"
 S3_REGION = "us-east-1"
 S3_ACCESS_KEY = "YOUR_ACCESS_KEY"
 S3_SECRET_KEY = "YOUR_SECRET_KEY"
 
+DEFAULT_BATCH_ROWS = 100_000
+FILE_CACHE_SIZE = 512      # pruning results kept (LRU); 0 disables the cache
+FILE_CACHE_TTL = 5.0       # seconds a table's metadata version is trusted before re-checking
+RESULT_CACHE_DIR = None    # directory for cached query results; None disables the result cache
+RESULT_CACHE_BYTES = 2 * 1024**3
+LOCAL_CACHE_DIR = None     # directory for local copies of remote Parquet files; None reads S3 directly
+FILTER_CACHE_SIZE = 1024   # parsed sql_filter pruning predicates / expression column refs kept
+
+
+def _as_list(val):
+    if val is None:
+        return []
+    return [val] if isinstance(val, str) else list(val)
+
+
+def _quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _freeze(val):
+    if isinstance(val, (list, tuple, set)):
+        return tuple(_freeze(v) for v in val)
+    return val.isoformat() if isinstance(val, date) else val
+
+
+def _pruning_key(table, region, date_range, column_filter):
+    """Hashable, normalized form of a pruning request, e.g. '>=' vs ' >= ' or list vs tuple values."""
+    column_filter = _freeze(normalize(column_filter))
+    return table, region or None, _freeze(date_range) if date_range else None, column_filter
+
 
 class SmartQueryEngine:
-    def __init__(self, db_file=DUCKDB_FILE):
-        self.con = duckdb.connect(db_file)
-        self.con.execute("INSTALL httpfs; LOAD httpfs;")
-        self.con.execute(f"SET s3_region='{S3_REGION}';")
-        self.con.execute(f"SET s3_access_key_id='{S3_ACCESS_KEY}';")
-        self.con.execute(f"SET s3_secret_access_key='{S3_SECRET_KEY}';")
+    """
+    ``result_cache_dir`` keeps query()/query_arrow() results as Parquet, keyed
+    by the query and the pruned files' size/last-modified/ETag, and
+    ``local_cache_dir`` reads remote files through local copies
+    (local_file_cache.py); both are evicted least-recently-used beyond their
+    byte budgets. ``read_only=True`` reads the loader's published snapshot.
+    """
+
+    def __init__(self, db_file=DUCKDB_FILE, file_cache_size=FILE_CACHE_SIZE, file_cache_ttl=FILE_CACHE_TTL,
+                 result_cache_dir=RESULT_CACHE_DIR, result_cache_bytes=RESULT_CACHE_BYTES,
+                 local_cache_dir=LOCAL_CACHE_DIR, local_cache_bytes=LOCAL_CACHE_BYTES,
+                 pool=None, read_only=False):
+        # Engines on the same file share one pooled DuckDB session (see connection_pool.py).
+        self._pool = pool or shared_pool(db_file, read_only)
+        self._session = threading.local()
+        self._cache_lock = threading.Lock()
+        self._stats_types = {}
+        self._columns = {}
+        self._file_cache = OrderedDict()
+        self._file_cache_size = file_cache_size
+        self._file_cache_ttl = file_cache_ttl
+        self._table_versions = {}
+        self._zone_maps = {}
+        self._filter_predicates = OrderedDict()
+        self._expression_names = OrderedDict()
+        self._result_cache_dir = result_cache_dir
+        self._result_cache_bytes = result_cache_bytes
+        if result_cache_dir:
+            os.makedirs(result_cache_dir, exist_ok=True)
+        self._local_files = None
+        if local_cache_dir:
+            self._local_files = LocalFileCache(local_cache_dir, local_cache_bytes, s3_client_kwargs={
+                "region_name": S3_REGION,
+                "aws_access_key_id": S3_ACCESS_KEY,
+                "aws_secret_access_key": S3_SECRET_KEY,
+            })
+
+    @property
+    def con(self):
+        """The pooled cursor checked out by the current thread's call (the root connection outside one)."""
+        return getattr(self._session, "con", None) or self._pool.root
+
+    @contextmanager
+    def _checkout(self):
+        if getattr(self._session, "con", None) is not None:
+            yield  # nested call on this thread: keep the cursor already held
+            return
+        with self._pool.connection() as con:
+            self._session.con = con
+            try:
+                yield
+            finally:
+                self._session.con = None
+
+    def _stats_type(self, table, column):
+        """Typed bound pair (double/bigint/date/varchar) a column's stats live in; cached until the table changes."""
+        key = (table, column)
+        version = self._table_version(table)
+        cached = self._stats_types.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        row = self.con.execute("""
+            SELECT stats_type FROM parquet_zone_maps
+            WHERE table_name=$1 AND column_name=$2 AND stats_type IS NOT NULL
+            LIMIT 1
+        """, [table, column]).fetchone()
+        self._stats_types[key] = (version, row[0] if row else None)
+        return self._stats_types[key][1]
+
+    def _table_columns(self, table):
+        """Top-level column names seen in the table's stats, in file order; cached like stats types."""
+        version = self._table_version(table)
+        cached = self._columns.get(table)
+        if cached and cached[0] == version:
+            return cached[1]
+        rows = self.con.execute("""
+            SELECT s.column_name FROM parquet_column_stats s JOIN parquet_files f USING (file_name)
+            WHERE f.table_name=$1
+            GROUP BY s.column_name ORDER BY MIN(s.rowid)
+        """, [table]).fetchall()
+        self._columns[table] = (version, [r[0] for r in rows if "." not in r[0]])
+        return self._columns[table][1]
+
+    def _names(self, expr):
+        """Column names an SQL expression references (lower-cased, from DuckDB's parser); cached per expression."""
+        with self._cache_lock:
+            if expr in self._expression_names:
+                return self._expression_names[expr]
+        # Unparseable text references nothing here; running the query reports the syntax error.
+        names = referenced_names(self.con, expr) or set()
+        with self._cache_lock:
+            self._expression_names[expr] = names
+            while len(self._expression_names) > FILTER_CACHE_SIZE:
+                self._expression_names.popitem(last=False)
+        return names
+
+    def _referenced_columns(self, table, *exprs):
+        """Table columns named in SQL expressions; identifiers are case-insensitive, as in DuckDB."""
+        names = set().union(*(self._names(expr) for expr in exprs if expr))
+        return [c for c in self._table_columns(table) if c.lower() in names]
+
+    def _table_version(self, table):
+        """
+        (latest last_updated, file count) for a table, read from the loader's
+        partition catalog. The loader bumps last_updated on every upsert and
+        deletions change the count, so any ingest changes the version.
+        Re-read at most once per file_cache_ttl.
+        """
+        now = time.monotonic()
+        cached = self._table_versions.get(table)
+        if cached and now - cached[1] < self._file_cache_ttl:
+            return cached[0]
+        version = self.con.execute(TABLE_VERSION_SQL, [table]).fetchone()
+        self._table_versions[table] = (version, now)
+        return version
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._file_cache.clear()
+            self._table_versions.clear()
+            self._zone_maps.clear()
+            self._stats_types.clear()
+            self._columns.clear()
+            self._filter_predicates.clear()
+
+    def _select_row_groups(self, table, region=None, date_range=None, column_filter=None):
+        """
+        Prune to the files, and within them the row groups, that may hold matching
+        rows. Returns {file_name: None (read whole file) | [(first_row, last_row), ...]}.
+        Results are cached per normalized predicate until the table's metadata changes.
+        """
+        if not self._file_cache_size:
+            return self._prune(table, region, date_range, column_filter)
+        key = _pruning_key(table, region, date_range, column_filter)
+        version = self._table_version(table)
+        with self._cache_lock:
+            cached = self._file_cache.get(key)
+            if cached and cached[0] == version:
+                self._file_cache.move_to_end(key)
+                return cached[1]
+        selection = self._prune(table, region, date_range, column_filter)
+        with self._cache_lock:
+            self._file_cache[key] = (version, selection)
+            self._file_cache.move_to_end(key)
+            while len(self._file_cache) > self._file_cache_size:
+                self._file_cache.popitem(last=False)
+        return selection
+
+    def _zone_map(self, table, rebuild=False):
+        """The table's in-memory pruning index (zone_map_index.py), rebuilt when its metadata version changes."""
+        from zone_map_index import ZoneMapIndex
+
+        version = self._table_version(table)
+        with self._cache_lock:
+            cached = self._zone_maps.get(table)
+        if cached and cached[0] == version and not rebuild:
+            return cached[1]
+        index = ZoneMapIndex(self.con, table)
+        with self._cache_lock:
+            self._zone_maps[table] = (version, index)
+        return index
+
+    def _prune(self, table, region=None, date_range=None, column_filter=None):
+        from zone_map_index import StaleIndexError
+
+        predicate = normalize(column_filter)
+        stats_types = {col: self._stats_type(table, col) for col in predicate_columns(predicate)}
+        try:
+            return self._zone_map(table).select(self.con, region, date_range, predicate, stats_types)
+        except StaleIndexError:
+            # An ingest landed between loading the index and one of its columns.
+            return self._zone_map(table, rebuild=True).select(self.con, region, date_range, predicate, stats_types)
+
+    def _filter_predicate(self, table, sql_filter):
+        """
+        Pruning predicate implied by ``sql_filter`` (see predicates.from_sql_filter).
+        It depends only on the filter text and the table's column types, so it is
+        cached per filter until the table's metadata changes.
+        """
+        if not sql_filter:
+            return None
+        key = (table, sql_filter)
+        version = self._table_version(table)
+        with self._cache_lock:
+            cached = self._filter_predicates.get(key)
+            if cached and cached[0] == version:
+                self._filter_predicates.move_to_end(key)
+                return cached[1]
+        column_types = {c: self._stats_type(table, c) for c in self._referenced_columns(table, sql_filter)}
+        predicate = from_sql_filter(self.con, sql_filter, column_types)
+        with self._cache_lock:
+            self._filter_predicates[key] = (version, predicate)
+            self._filter_predicates.move_to_end(key)
+            while len(self._filter_predicates) > FILTER_CACHE_SIZE:
+                self._filter_predicates.popitem(last=False)
+        return predicate
 
     def _get_files(self, table, region=None, date_range=None, column_filter=None):
-        cond = [f"table_name='{table}'"]
-        if region:
-            cond.append(f"region='{region}'")
-        if date_range:
-            cond.append(f"eod_date BETWEEN '{date_range[0]}' AND '{date_range[1]}'")
-        if column_filter:
-            col, op, val = column_filter
-            cond.append(f"column_name='{col}' AND CAST(statistics_max AS DOUBLE) {op} {val}")
-        where = " AND ".join(cond)
-        q = f"SELECT DISTINCT file_name FROM parquet_file_metadata WHERE {where}"
-        return self.con.execute(q).df()["file_name"].tolist()
-
-    def query(self, table, sql_filter=None, region=None, date_range=None, column_filter=None):
-        files = self._get_files(table, region, date_range, column_filter)
-        if not files:
-            print("⚠️ No matching files found.")
-            return pd.DataFrame()
-        file_list = "ARRAY" + str(files)
-        q = f"SELECT * FROM read_parquet({file_list})"
+        with self._checkout():
+            return list(self._select_row_groups(table, region, date_range, column_filter))
+
+    @staticmethod
+    def _scan_sql(selection, columns=None):
+        """
+        Whole files are read in one read_parquet(); partially selected files get
+        their own scan filtered on file_row_number, which DuckDB turns into
+        row-group skips so only the qualifying byte ranges are fetched.
+        ``columns`` limits every scan to those column chunks. File names are
+        bound as named parameters; returns (sql, params).
+        """
+        projection = ", ".join(_quote_ident(c) for c in columns) if columns else "*"
+        whole = [f for f, ranges in selection.items() if ranges is None]
+        parts, params = [], {}
+        if whole:
+            parts.append(f"SELECT {projection} FROM read_parquet($files)")
+            params["files"] = whole
+        for i, (file_name, ranges) in enumerate(r for r in selection.items() if r[1] is not None):
+            row_filter = " OR ".join(f"file_row_number BETWEEN {a} AND {b}" for a, b in ranges)
+            partial_projection = projection if columns else "* EXCLUDE (file_row_number)"
+            parts.append(
+                f"SELECT {partial_projection} FROM read_parquet($file_{i}, file_row_number=true) "
+                f"WHERE {row_filter}"
+            )
+            params[f"file_{i}"] = file_name
+        return "\nUNION ALL\n".join(parts), params
+
+    def _read_bytes(self, selection, columns=None):
+        """Compressed size of the column chunks a scan of ``selection`` touches."""
+        if not selection:
+            return 0
+        ranges = [(f, a, b) for f, rs in selection.items() if rs is not None for a, b in rs]
+        params = {
+            "files": list(selection),
+            "columns": list(columns) if columns else ["*"],
+            "range_files": [r[0] for r in ranges] or [""],
+            "range_lo": [r[1] for r in ranges] or [0],
+            "range_hi": [r[2] for r in ranges] or [-1],
+        }
+        return self.con.execute("""
+            WITH r AS (
+                SELECT unnest($range_files) AS file_name, unnest($range_lo) AS lo, unnest($range_hi) AS hi
+            ),
+            c AS (
+                SELECT file_name, total_compressed_size,
+                       SUM(row_group_num_rows) OVER (PARTITION BY file_name, column_name ORDER BY row_group)
+                         - row_group_num_rows AS first_row
+                FROM parquet_column_stats
+                WHERE file_name IN (SELECT unnest($files))
+                  AND (list_contains($columns, '*') OR column_name IN (SELECT unnest($columns)))
+            )
+            SELECT COALESCE(SUM(c.total_compressed_size), 0)::BIGINT
+            FROM c LEFT JOIN r USING (file_name)
+            WHERE r.file_name IS NULL OR c.first_row BETWEEN r.lo AND r.hi
+        """, params).fetchone()[0]
+
+    def _plan(self, table, columns=None, select=None, group_by=None, sql_filter=None,
+              region=None, date_range=None, column_filter=None):
+        """Row-group selection, scanned columns, final SQL and its parameters for a query."""
+        columns, select, group_by = _as_list(columns), _as_list(select), _as_list(group_by)
+        # The sargable part of sql_filter prunes alongside column_filter; the filter itself still runs.
+        predicate = normalize([column_filter, self._filter_predicate(table, sql_filter)])
+        selection = self._select_row_groups(table, region, date_range, predicate)
+
+        scan_columns = None
+        if columns or select:
+            known = {c.lower(): c for c in self._table_columns(table)}
+            needed = {known.get(c.lower(), c) for c in [*columns, *predicate_columns(predicate)]}
+            needed.update(self._referenced_columns(table, *select, *group_by, sql_filter))
+            # Keep file order so the scan lines up with the Parquet schema.
+            scan_columns = [c for c in self._table_columns(table) if c in needed]
+            scan_columns += sorted(needed - set(scan_columns))
+
+        outputs = [_quote_ident(c) for c in columns] + select
+        scan, params = self._scan_sql(selection, scan_columns)
+        q = f"SELECT {', '.join(outputs) or '*'} FROM ({scan})"
         if sql_filter:
             q += f" WHERE {sql_filter}"
-        print(f"🚀 Querying {len(files)} files for {table}")
-        return self.con.execute(q).df()
+        if group_by:
+            q += f" GROUP BY {', '.join(group_by)}"
+        return selection, scan_columns, q, params
+
+    def estimate_bytes(self, table, columns=None, select=None, group_by=None, sql_filter=None,
+                       region=None, date_range=None, column_filter=None):
+        """Compressed bytes a query would read, from the stored column-chunk sizes."""
+        with self._checkout():
+            selection, scan_columns, _, _ = self._plan(table, columns, select, group_by, sql_filter,
+                                                    region, date_range, column_filter)
+            return self._read_bytes(selection, scan_columns)
+
+    def _prepare(self, table, sql_filter=None, region=None, date_range=None, column_filter=None,
+                 columns=None, select=None, group_by=None):
+        """Plan a query; returns (selection, scan_columns, sql, params), or None if nothing matches."""
+        plan = self._plan(table, columns, select, group_by, sql_filter, region, date_range, column_filter)
+        if not plan[0]:
+            print("⚠️ No matching files found.")
+            return None
+        return plan
+
+    def _report(self, table, selection, scan_columns):
+        # The byte count is left to estimate_bytes(): summing chunk sizes costs a metadata scan per query.
+        partial = sum(ranges is not None for ranges in selection.values())
+        scanned = f"{len(scan_columns)} column(s)" if scan_columns else "all columns"
+        print(f"🚀 Querying {len(selection)} files ({partial} by row group) for {table}: {scanned}")
+
+    def _result_cache_path(self, sql, params, selection):
+        """
+        Cache file for a query: its SQL and parameters (which already carry the
+        pruned files and row ranges) plus each file's size, last-modified and
+        ETag as tracked by the loader, so a rewritten file changes the key.
+        """
+        fingerprint = self.con.execute("""
+            SELECT file_name, file_size, last_modified, etag FROM parquet_files
+            WHERE file_name IN (SELECT unnest($files)) ORDER BY file_name
+        """, {"files": list(selection)}).fetchall()
+        digest = hashlib.sha256(repr((sql, sorted(params.items()), fingerprint)).encode()).hexdigest()
+        return os.path.join(self._result_cache_dir, f"{digest}.parquet")
+
+    def _store_result(self, result, path):
+        """Write a result to the cache; failing to store it only skips the cache entry, never the query."""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self.con.register("cached_result", result)
+            try:
+                self.con.execute("COPY cached_result TO $path (FORMAT PARQUET)", {"path": tmp_path})
+            finally:
+                self.con.unregister("cached_result")
+            if os.path.getsize(tmp_path) > self._result_cache_bytes:
+                os.remove(tmp_path)  # would evict everything else and still not fit
+                return
+            os.replace(tmp_path, path)
+            evict_lru(self._result_cache_dir, self._result_cache_bytes, ".parquet")
+        except Exception as exc:
+            print(f"⚠️ Could not cache query result: {exc}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _localize(self, params):
+        """
+        Swap remote file names in scan parameters for local cached copies,
+        downloading as needed. Returns (params, local paths); the copies are
+        kept from eviction until _release() is called with those paths.
+        """
+        if self._local_files is None:
+            return params, []
+        remote = {f for v in params.values() for f in (v if isinstance(v, list) else [v]) if is_remote(f)}
+        if not remote:
+            return params, []
+        tracked = self.con.execute("""
+            SELECT file_name, file_size, COALESCE(etag, CAST(last_modified AS VARCHAR)) FROM parquet_files
+            WHERE file_name IN (SELECT unnest($files))
+        """, {"files": sorted(remote)}).fetchall()
+        local = self._local_files.fetch_many(self.con, tracked)
+        params = {k: [local.get(f, f) for f in v] if isinstance(v, list) else local.get(v, v) for k, v in params.items()}
+        return params, list(local.values())
+
+    def _release(self, local):
+        if local:
+            self._local_files.release(local)
+
+    def _run(self, table, plan, fetch):
+        """Execute a plan through the result cache (when enabled); ``fetch`` materializes a DuckDB result."""
+        selection, scan_columns, q, params = plan
+        path = self._result_cache_path(q, params, selection) if self._result_cache_dir else None
+        if path and os.path.exists(path):
+            try:
+                cached = fetch(self.con.execute("SELECT * FROM read_parquet($path)", {"path": path}))
+                os.utime(path)
+                print(f"♻️ Serving {table} query from result cache")
+                return cached
+            except duckdb.IOException:
+                pass  # evicted by another process in between
+        self._report(table, selection, scan_columns)
+        params, local = self._localize(params)
+        try:
+            result = fetch(self.con.execute(q, params))
+        finally:
+            self._release(local)
+        if path:
+            self._store_result(result, path)
+        return result
+
+    def query(self, table, sql_filter=None, region=None, date_range=None, column_filter=None,
+              columns=None, select=None, group_by=None):
+        """
+        Rows of ``table`` matching ``sql_filter``, as a DataFrame.
+
+        Files and row groups are pruned by ``region``, ``date_range`` and their
+        min/max stats: ``column_filter`` takes comparisons and AND/OR groups
+        (see predicates.py), and comparisons against constants in
+        ``sql_filter`` prune the same way. ``columns`` names output columns and
+        ``select``/``group_by`` take SQL expressions; only the columns these and
+        the filters reference are scanned.
+        """
+        with self._checkout():
+            plan = self._prepare(table, sql_filter, region, date_range, column_filter, columns, select, group_by)
+            if plan is None:
+                import pandas as pd
+                return pd.DataFrame()
+            return self._run(table, plan, lambda result: result.df())
+
+    def query_arrow(self, table, sql_filter=None, region=None, date_range=None, column_filter=None,
+                    columns=None, select=None, group_by=None):
+        """Same as query() but returns a pyarrow.Table built straight from DuckDB's Arrow export."""
+        with self._checkout():
+            plan = self._prepare(table, sql_filter, region, date_range, column_filter, columns, select, group_by)
+            if plan is None:
+                import pyarrow as pa
+                return pa.table({})
+            return self._run(table, plan, fetch_arrow)
+
+    def query_batches(self, table, sql_filter=None, region=None, date_range=None, column_filter=None,
+                      columns=None, select=None, group_by=None, batch_size=DEFAULT_BATCH_ROWS,
+                      as_pandas=False):
+        """
+        Stream the result as Arrow RecordBatches (or pandas DataFrames with
+        ``as_pandas=True``) of up to ``batch_size`` rows, so only one batch is
+        held in memory at a time. The stream runs on its own cursor, so other
+        queries on the engine may be issued between batches and the stream
+        does not hold a pool slot. Streams bypass the result cache.
+        """
+        with self._checkout():
+            plan = self._prepare(table, sql_filter, region, date_range, column_filter, columns, select, group_by)
+            if plan is None:
+                return
+            selection, scan_columns, q, params = plan
+            self._report(table, selection, scan_columns)
+            params, local = self._localize(params)
+        try:
+            with self._pool.cursor() as cur:
+                result = cur.execute(q, params)
+                if hasattr(result, "to_arrow_reader"):
+                    reader = result.to_arrow_reader(batch_size)
+                else:
+                    reader = result.fetch_record_batch(batch_size)
+                for batch in reader:
+                    yield batch.to_pandas() if as_pandas else batch
+        finally:
+            self._release(local)
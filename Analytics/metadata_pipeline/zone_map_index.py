@@ -0,0 +1,221 @@
+"""
+zone_map_index.py
+---------------------------------------------------------
+In-memory pruning index for SmartQueryEngine, loaded from the loader's
+clustered parquet_row_groups / parquet_zone_maps tables.
+
+One index per table holds its row groups as numpy arrays ordered by
+(eod_date, file_name, row_group): a date range is a binary search over the
+sorted partitions, a region is a mask over per-file codes, and min/max checks
+run vectorized over the typed bounds of the filtered column, which are loaded
+the first time that column is filtered on. Planning cost follows the size of
+the selected slice rather than the number of files the lake has tracked.
+"""
+
+from datetime import date
+
+import numpy as np
+
+from metadata_utils import TABLE_VERSION_SQL, fetch_arrow
+from predicates import evaluate
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Typed bound pair -> (min SQL, max SQL, fill for missing bounds, numpy dtype).
+# Dates are compared as days since the epoch.
+BOUND_SQL = {
+    "double": ("z.min_double", "z.max_double", "0.0", np.float64),
+    "bigint": ("z.min_bigint", "z.max_bigint", "0", np.int64),
+    "date": ("date_diff('day', DATE '1970-01-01', z.min_date)",
+             "date_diff('day', DATE '1970-01-01', z.max_date)", "0", np.int64),
+    "varchar": ("z.min_varchar", "z.max_varchar", "''", object),
+}
+
+
+class StaleIndexError(Exception):
+    """The table's metadata changed after the index was built; rebuild it."""
+
+
+def _coerce(stats_type, values):
+    """Filter values in the bounds' domain, as CAST(value AS <stats type>) would give them."""
+    if stats_type == "double":
+        return [float(v) for v in values]
+    if stats_type == "bigint":
+        return values if all(isinstance(v, int) for v in values) else [float(v) for v in values]
+    if stats_type == "date":
+        return [(v if isinstance(v, date) else date.fromisoformat(str(v)[:10])).toordinal() - EPOCH_ORDINAL
+                for v in values]
+    return [str(v) for v in values]
+
+
+def bounds_match(lo, hi, op, values):
+    """
+    Mask of row groups whose [lo, hi] bounds may hold a row matching
+    ``column op value``. Row groups without bounds are the caller's to keep.
+    """
+    op = op.strip().upper()
+    v = values[0]
+    if op == "=":
+        return (lo <= v) & (hi >= v)
+    if op in ("!=", "<>"):
+        return ~((lo == v) & (hi == v))
+    if op == "<":
+        return lo < v
+    if op == "<=":
+        return lo <= v
+    if op == ">":
+        return hi > v
+    if op == ">=":
+        return hi >= v
+    if op == "BETWEEN":
+        return (hi >= values[0]) & (lo <= values[1])
+    if op == "IN":
+        hit = np.zeros(len(lo), dtype=bool)
+        for v in values:
+            hit |= (lo <= v) & (hi >= v)
+        return hit
+    raise ValueError(f"Unsupported pruning operator: {op}")
+
+
+class ZoneMapIndex:
+    def __init__(self, con, table):
+        self.table = table
+        self._bounds = {}
+        con.execute("BEGIN TRANSACTION;")
+        try:
+            self.version = con.execute(TABLE_VERSION_SQL, [table]).fetchone()
+            files = fetch_arrow(con.execute("""
+                SELECT file_name, eod_date, region, COUNT(*) AS num_row_groups
+                FROM parquet_row_groups WHERE table_name=$1
+                GROUP BY file_name, eod_date, region
+                ORDER BY eod_date, file_name
+            """, [table]))
+            row_groups = fetch_arrow(con.execute("""
+                SELECT first_row, num_rows FROM parquet_row_groups WHERE table_name=$1
+                ORDER BY eod_date, file_name, row_group
+            """, [table]))
+        finally:
+            con.execute("COMMIT;")
+
+        # File names stay in one Arrow string array instead of a Python object per file.
+        self._file_names = files["file_name"].combine_chunks()
+        dates = files["eod_date"].combine_chunks().dictionary_encode()
+        regions = files["region"].combine_chunks().dictionary_encode()
+        self._dates = np.array(dates.dictionary.to_pylist(), dtype=str)
+        # Files are sorted by date, so each date's files are one run: keep where each run starts.
+        self._date_start = np.searchsorted(dates.indices.to_numpy(), np.arange(len(self._dates) + 1))
+        self._regions = {name: code for code, name in enumerate(regions.dictionary.to_pylist())}
+        self._file_region = regions.indices.to_numpy()
+        self._file_groups = files["num_row_groups"].to_numpy()
+        self._file_start = np.concatenate([[0], np.cumsum(self._file_groups)])
+        self._first_row = row_groups["first_row"].to_numpy()
+        self._num_rows = row_groups["num_rows"].to_numpy()
+
+    def __len__(self):
+        return len(self._file_names)
+
+    def _file_range(self, date_range):
+        """[first, last) file positions inside ``date_range`` (files are sorted by date)."""
+        if not date_range:
+            return 0, len(self)
+        lo, hi = (d.isoformat() if isinstance(d, date) else str(d) for d in date_range)
+        first_date = np.searchsorted(self._dates, lo, side="left")
+        end_date = max(np.searchsorted(self._dates, hi, side="right"), first_date)
+        return int(self._date_start[first_date]), int(self._date_start[end_date])
+
+    def _column_bounds(self, con, column, stats_type):
+        """(known, lo, hi) arrays aligned to the row-group axis; missing bounds are unknown."""
+        key = (column, stats_type)
+        if key in self._bounds:
+            return self._bounds[key]
+        lo_sql, hi_sql, fill, dtype = BOUND_SQL[stats_type]
+        con.execute("BEGIN TRANSACTION;")
+        try:
+            version = con.execute(TABLE_VERSION_SQL, [self.table]).fetchone()
+            rows = fetch_arrow(con.execute(f"""
+                WITH axis AS (
+                    SELECT file_name, row_group,
+                           row_number() OVER (ORDER BY eod_date, file_name, row_group) - 1 AS pos
+                    FROM parquet_row_groups WHERE table_name=$1
+                )
+                SELECT a.pos, ({lo_sql}) IS NOT NULL AND ({hi_sql}) IS NOT NULL AS known,
+                       COALESCE({lo_sql}, {fill}) AS lo, COALESCE({hi_sql}, {fill}) AS hi
+                FROM parquet_zone_maps z JOIN axis a USING (file_name, row_group)
+                WHERE z.table_name=$1 AND z.column_name=$2 AND z.stats_type=$3
+            """, [self.table, column, stats_type]))
+        finally:
+            con.execute("COMMIT;")
+        if version != self.version:
+            raise StaleIndexError(self.table)
+
+        size = len(self._first_row)
+        known = np.zeros(size, dtype=bool)
+        lo = np.zeros(size, dtype=dtype) if dtype is not object else np.full(size, "", dtype=object)
+        hi = lo.copy()
+        pos = rows["pos"].to_numpy()
+        known[pos] = rows["known"].to_numpy()
+        lo[pos] = rows["lo"].to_numpy(zero_copy_only=False)
+        hi[pos] = rows["hi"].to_numpy(zero_copy_only=False)
+        self._bounds[key] = (known, lo, hi)
+        return self._bounds[key]
+
+    def select(self, con, region=None, date_range=None, predicate=None, stats_types=None):
+        """
+        Same contract as SmartQueryEngine._select_row_groups(): {file_name: None
+        (whole file) | [(first_row, last_row), ...]}, in file name order.
+        ``predicate`` is a normalized predicate (predicates.py); comparisons on
+        columns without an entry in ``stats_types`` never prune.
+        """
+        first, end = self._file_range(date_range)
+        files = np.arange(first, end)
+        if region:
+            code = self._regions.get(region)
+            if code is None:
+                return {}
+            files = files[self._file_region[first:end] == code]
+
+        row_first, row_end = self._file_start[first], self._file_start[end]
+
+        def leaf(col, op, val):
+            stats_type = (stats_types or {}).get(col)
+            if not stats_type:
+                return None
+            values = _coerce(stats_type, list(val) if isinstance(val, (list, tuple, set)) else [val])
+            known, lo, hi = self._column_bounds(con, col, stats_type)
+            lo, hi = lo[row_first:row_end], hi[row_first:row_end]
+            if stats_type == "bigint" and not all(isinstance(v, int) for v in values):
+                lo, hi = lo.astype(np.float64), hi.astype(np.float64)
+            return ~known[row_first:row_end] | bounds_match(lo, hi, op, values)
+
+        hit = evaluate(predicate, leaf) if predicate and len(files) else None
+        if hit is None:
+            return {name: None for name in sorted(self._file_names.take(files).to_pylist())}
+        return self._selection(files, first, end, hit)
+
+    def _selection(self, files, first, end, hit):
+        """Turn a row-group hit mask over files [first, end) into whole files and merged row ranges."""
+        row_first = self._file_start[first]
+        groups = self._file_groups[first:end]
+        hits = np.add.reduceat(hit.astype(np.int64), self._file_start[first:end] - row_first)
+        chosen = np.zeros(end - first, dtype=bool)
+        chosen[files - first] = True
+        whole = chosen & (hits == groups)
+        partial = chosen & (hits > 0) & ~whole
+
+        selected = np.flatnonzero(whole | partial) + first
+        names = dict(zip(selected.tolist(), self._file_names.take(selected).to_pylist()))
+        selection = {names[f]: None for f in (np.flatnonzero(whole) + first).tolist()}
+
+        # Hit row groups of partially selected files, merged into contiguous row ranges per file.
+        rows = np.flatnonzero(hit & np.repeat(partial, groups)) + row_first
+        if len(rows):
+            row_file = np.searchsorted(self._file_start, rows, side="right") - 1
+            starts = self._first_row[rows]
+            lasts = starts + self._num_rows[rows] - 1
+            new_range = np.concatenate([[True], (row_file[1:] != row_file[:-1]) | (starts[1:] != lasts[:-1] + 1)])
+            breaks = np.flatnonzero(new_range)
+            range_ends = np.append(breaks[1:] - 1, len(rows) - 1)
+            for f, first_row, last_row in zip(row_file[breaks].tolist(), starts[breaks].tolist(),
+                                              lasts[range_ends].tolist()):
+                selection.setdefault(names[f], []).append((first_row, last_row))
+        return dict(sorted(selection.items()))
@@ -1,12 +1,11 @@
+from Analytics.duckdb_batch_variance import run_multi_region_variance
 
-from Analytics.duckdb_batch_variance import run_variance_analysis
-
-results = run_variance_analysis(
-    parquet_root="/data/batch_metrics/",
-    region="APAC",
-    baseline_date="2025-10-01",
-    compare_date="2025-10-08",
-    pct_threshold=0.20,
-    delta_thresholds={"raw": 10, "cpu": 5, "sec": 10},
-    out_dir="./output"
-)
+if __name__ == "__main__":
+    results = run_multi_region_variance(
+        parquet_root="/data/batch_metrics/",
+        baseline_date="2025-10-01",
+        compare_date="2025-10-08",
+        pct_threshold=0.20,
+        delta_thresholds={"raw": 10, "cpu": 5, "sec": 10},
+        out_dir="./output"
+    )
@@ -0,0 +1,394 @@
+"""
+test_pruning.py
+---------------------------------------------------------
+Randomized checks of SmartQueryEngine's pruning against brute force over a
+small synthetic lake (rows, row groups and zone maps generated straight into
+an in-memory metadata database, no Parquet files).
+
+For random AND/OR predicates, regions and date ranges, ZoneMapIndex.select()
+must return exactly the row groups whose min/max bounds allow a match (row
+groups without bounds are always kept) and never drop a row that matches;
+predicates derived from the equivalent SQL text by from_sql_filter() must
+select the same row groups.
+
+Usage:
+    python -m pytest -q Analytics/tests
+"""
+
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import duckdb
+import numpy as np
+import pytest
+
+PIPELINE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "metadata_pipeline")
+sys.path.insert(0, PIPELINE_DIR)
+
+from metadata_auto_loader import (  # noqa: E402
+    LISTING_COLUMNS, build_partition_tree, cluster_zone_maps, create_metadata_schema, list_lake, partition_files,
+    update_metadata_for_table_date,
+)
+from predicates import evaluate, from_sql_filter, normalize, predicate_columns  # noqa: E402
+from zone_map_index import ZoneMapIndex  # noqa: E402
+
+TABLE = "events"
+REGIONS = ["apac", "emea", "nam"]
+FIRST_DATE = date(2025, 10, 20)
+DATES = 6
+ROWS_PER_GROUP = 8
+# Columns with zone maps; ``flag`` has none, so comparisons on it never prune.
+STATS_TYPES = {"amount": "double", "qty": "bigint", "order_date": "date", "customer": "varchar"}
+BOUND_COLUMNS = {"double": "_double", "bigint": "_bigint", "date": "_date", "varchar": "_varchar"}
+FLIPPED = {"=": "=", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+RUNS = 300
+
+
+@pytest.fixture(scope="module")
+def lake():
+    con = duckdb.connect()
+    create_metadata_schema(con)
+    # 1-4 row groups per file, values clustered per row group so min/max bounds can prune.
+    con.execute(f"""
+        CREATE TABLE lake_rows AS
+        WITH files AS (
+            SELECT '{TABLE}' AS table_name, r.region, strftime(DATE '{FIRST_DATE}' + d::INT, '%Y-%m-%d') AS eod_date,
+                   'file:///lake/{TABLE}/region=' || r.region || '/eod_date='
+                     || strftime(DATE '{FIRST_DATE}' + d::INT, '%Y-%m-%d') || '/part-' || f || '.parquet' AS file_name,
+                   1 + hash(r.region, d, f) % 4 AS num_row_groups
+            FROM (VALUES {", ".join(f"('{r}')" for r in REGIONS)}) r(region), range({DATES}) a(d), range(3) b(f)
+            WHERE hash(r.region, d, f, 'keep') % 4 <> 0
+        ),
+        groups AS (
+            SELECT files.*, rg AS row_group FROM files, range(4) g(rg) WHERE rg < num_row_groups
+        )
+        SELECT table_name, region, eod_date, file_name, row_group::INTEGER AS row_group,
+               row_group * {ROWS_PER_GROUP} + i AS file_row_number,
+               (hash(file_name, row_group) % 100) * 10 + (hash(file_name, row_group, i) % 30) / 2.0 AS amount,
+               ((hash(file_name, row_group, 'q') % 6) + hash(file_name, row_group, i, 'q') % 3)::BIGINT AS qty,
+               eod_date::DATE - (hash(file_name, row_group, 'd') % 20)::INT
+                 - (hash(file_name, row_group, i, 'd') % 3)::INT AS order_date,
+               'c' || lpad(((hash(file_name, row_group, 'c') % 50) + hash(file_name, row_group, i, 'c') % 5)::VARCHAR,
+                           3, '0') AS customer,
+               (hash(file_name, row_group, i, 'f') % 3)::BIGINT AS flag
+        FROM groups, range({ROWS_PER_GROUP}) r(i);
+    """)
+    con.execute("""
+        INSERT INTO parquet_row_groups BY NAME
+        SELECT table_name, region, eod_date, file_name, row_group,
+               MIN(file_row_number) AS first_row, COUNT(*) AS num_rows
+        FROM lake_rows GROUP BY ALL;
+    """)
+    for column, stats_type in STATS_TYPES.items():
+        suffix = BOUND_COLUMNS[stats_type]
+        con.execute(f"""
+            INSERT INTO parquet_zone_maps BY NAME
+            SELECT table_name, '{column}' AS column_name, eod_date, file_name, row_group,
+                   '{stats_type}' AS stats_type, MIN({column}) AS min{suffix}, MAX({column}) AS max{suffix}
+            FROM lake_rows GROUP BY ALL;
+        """)
+        # Some row groups were written without stats for this column.
+        con.execute(f"""
+            UPDATE parquet_zone_maps SET min{suffix} = NULL
+            WHERE column_name = '{column}' AND hash(file_name, row_group, column_name) % 10 = 0;
+        """)
+    con.execute("""
+        INSERT INTO parquet_partitions
+        SELECT table_name, region, eod_date, COUNT(DISTINCT file_name), COUNT(*), 0, TIMESTAMP '2025-11-01'
+        FROM lake_rows GROUP BY ALL;
+    """)
+    cluster_zone_maps(con)
+
+    row_groups = con.execute("""
+        SELECT file_name, region, eod_date, row_group, first_row, num_rows FROM parquet_row_groups
+    """).fetchall()
+    bounds = {}
+    for column, stats_type in STATS_TYPES.items():
+        suffix = BOUND_COLUMNS[stats_type]
+        for file_name, row_group, lo, hi in con.execute(f"""
+            SELECT file_name, row_group, min{suffix}, max{suffix} FROM parquet_zone_maps WHERE column_name = '{column}'
+        """).fetchall():
+            bounds[file_name, row_group, column] = None if lo is None or hi is None else (lo, hi)
+    yield con, ZoneMapIndex(con, TABLE), row_groups, bounds
+    con.close()
+
+
+# --- random predicates, rendered both as column_filter and as SQL ---
+def random_value(rng, column):
+    if column == "amount":
+        return rng.choice([rng.randint(0, 1000), round(rng.uniform(0, 1000), 1)])
+    if column in ("qty", "flag"):
+        return rng.choice([rng.randint(-1, 8), rng.randint(0, 8) + 0.5])
+    if column == "order_date":
+        day = FIRST_DATE + timedelta(days=rng.randint(-25, DATES + 1))
+        return rng.choice([day, day.isoformat()])
+    return f"c{rng.randint(0, 56):03d}"
+
+
+def random_leaf(rng):
+    column = rng.choice([*STATS_TYPES, "flag"])
+    op = rng.choice(["=", "!=", "<", "<=", ">", ">=", "BETWEEN", "IN"])
+    if op == "BETWEEN":
+        return column, op, tuple(sorted((random_value(rng, column), random_value(rng, column)), key=str))
+    if op == "IN":
+        return column, op, [random_value(rng, column) for _ in range(rng.randint(1, 3))]
+    return column, op, random_value(rng, column)
+
+
+def random_predicate(rng, depth=0):
+    if depth >= 2 or rng.random() < 0.4:
+        return random_leaf(rng)
+    children = [random_predicate(rng, depth + 1) for _ in range(rng.randint(1, 3))]
+    return rng.choice([children, {"and": children}, {"or": children}])
+
+
+def sql_literal(rng, column, value):
+    """The value as a SQL constant, typed or cast in one of the ways a caller might write it."""
+    if column == "order_date":
+        iso = value.isoformat() if isinstance(value, date) else value
+        return rng.choice([f"DATE '{iso}'", f"'{iso}'::DATE", f"CAST('{iso}' AS DATE)", f"'{iso}'"])
+    if column == "customer":
+        return rng.choice([f"'{value}'", f"CAST('{value}' AS VARCHAR)"])
+    if column == "amount" and isinstance(value, int):
+        return rng.choice([str(value), f"{value}::DOUBLE", f"CAST({value} AS DOUBLE)"])
+    if isinstance(value, int):
+        return rng.choice([str(value), f"CAST({value} AS BIGINT)"])
+    return str(value)
+
+
+def to_sql(rng, predicate):
+    if isinstance(predicate, tuple):
+        column, op, value = predicate
+        column_sql = rng.choice([column, column.upper(), f'"{column}"'])
+        if op == "BETWEEN":
+            low, high = (sql_literal(rng, column, v) for v in value)
+            return f"{column_sql} BETWEEN {low} AND {high}"
+        if op == "IN":
+            return f"{column_sql} IN ({', '.join(sql_literal(rng, column, v) for v in value)})"
+        op_sql = rng.choice(["!=", "<>"]) if op == "!=" else op
+        if rng.random() < 0.5:
+            return f"{column_sql} {op_sql} {sql_literal(rng, column, value)}"
+        flipped = rng.choice(["!=", "<>"]) if op == "!=" else FLIPPED[op]
+        return f"{sql_literal(rng, column, value)} {flipped} {column_sql}"
+    kind, children = ("AND", predicate) if isinstance(predicate, list) else next(iter(predicate.items()))
+    return "(" + f" {kind.upper()} ".join(to_sql(rng, c) for c in children) + ")"
+
+
+def random_slice(rng):
+    region = rng.choice([None, *REGIONS, "xx"])
+    date_range = None
+    if rng.random() < 0.6:
+        first = FIRST_DATE + timedelta(days=rng.randint(-1, DATES))
+        last = first + timedelta(days=rng.randint(-1, 3))
+        date_range = rng.choice([(first, last), (first.isoformat(), last.isoformat())])
+    return region, date_range
+
+
+# --- brute force ---
+def may_match(lo, hi, op, values):
+    if op == "=":
+        return lo <= values[0] <= hi
+    if op == "!=":
+        return not lo == values[0] == hi
+    if op == "<":
+        return lo < values[0]
+    if op == "<=":
+        return lo <= values[0]
+    if op == ">":
+        return hi > values[0]
+    if op == ">=":
+        return hi >= values[0]
+    if op == "BETWEEN":
+        return hi >= values[0] and lo <= values[1]
+    return any(lo <= v <= hi for v in values)
+
+
+def as_column_value(column, value):
+    if column == "order_date":
+        return value if isinstance(value, date) else date.fromisoformat(value)
+    return float(value) if column == "amount" else value
+
+
+def expected_row_groups(lake, region, date_range, predicate):
+    """Row groups in the slice whose bounds allow a match, evaluated one at a time in plain Python."""
+    _, _, row_groups, bounds = lake
+    lo_date, hi_date = (str(d) for d in date_range) if date_range else (None, None)
+
+    def keep(file_name, row_group, p):
+        if len(p) == 2:
+            hits = [keep(file_name, row_group, c) for c in p[1]]
+            return all(hits) if p[0] == "AND" else any(hits)
+        column, op, value = p
+        known = bounds.get((file_name, row_group, column))
+        if known is None:
+            return True
+        values = [as_column_value(column, v) for v in (value if isinstance(value, tuple) else [value])]
+        return may_match(*known, op.replace("<>", "!="), values)
+
+    return {
+        (file_name, row_group)
+        for file_name, rg_region, eod_date, row_group, _, _ in row_groups
+        if (not region or rg_region == region)
+        and (not date_range or lo_date <= eod_date <= hi_date)
+        and (predicate is None or keep(file_name, row_group, predicate))
+    }
+
+
+def matching_row_groups(lake, region, date_range, where):
+    con = lake[0]
+    conditions, params = [where], []
+    if region:
+        conditions.append("region = ?")
+        params.append(region)
+    if date_range:
+        conditions.append("eod_date BETWEEN ? AND ?")
+        params += [str(d) for d in date_range]
+    return set(con.execute(
+        f"SELECT DISTINCT file_name, row_group FROM lake_rows WHERE {' AND '.join(conditions)}", params
+    ).fetchall())
+
+
+def selected_row_groups(lake, selection):
+    """Expand a select() result to (file, row group) pairs; row ranges must cover whole row groups."""
+    _, _, row_groups, _ = lake
+    chosen = set()
+    for file_name, _, _, row_group, first_row, num_rows in row_groups:
+        if file_name not in selection:
+            continue
+        ranges = selection[file_name]
+        last_row = first_row + num_rows - 1
+        if ranges is None or any(a <= first_row and last_row <= b for a, b in ranges):
+            chosen.add((file_name, row_group))
+        else:
+            assert not any(a <= last_row and first_row <= b for a, b in ranges), (file_name, row_group, ranges)
+    assert all(ranges is None or ranges for ranges in selection.values())
+    return chosen
+
+
+def select(lake, region, date_range, predicate):
+    con, index, _, _ = lake
+    stats_types = {c: STATS_TYPES[c] for c in predicate_columns(predicate) if c in STATS_TYPES}
+    return selected_row_groups(lake, index.select(con, region, date_range, predicate, stats_types))
+
+
+# --- tests ---
+def test_normalize_flattens_and_canonicalizes():
+    a, b, c = ("a", "=", 1), ("b", "<", 2), ("c", ">", 3)
+    assert normalize([a, [b, {"and": [c]}]]) == ("AND", (a, b, c))
+    assert normalize({"or": [a, {"OR": [b, c]}]}) == ("OR", (a, b, c))
+    assert normalize({"or": [a, [b, c]]}) == ("OR", (a, ("AND", (b, c))))
+    assert normalize(("x", " >= ", 1)) == ("x", ">=", 1)
+    assert normalize(("x", "in", [2, 1])) == ("x", "IN", (2, 1))
+    assert normalize(["qty", ">", 5]) == ("qty", ">", 5)
+    assert normalize([None, a, []]) == a
+    assert normalize([]) is None
+    assert normalize(normalize([a, {"or": [b, c]}])) == normalize([a, {"or": [b, c]}])
+    assert predicate_columns(normalize([a, {"or": [b, a, c]}])) == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("predicate", [
+    ("x", "LIKE", 1),
+    ("x", "BETWEEN", (1, 2, 3)),
+    {"xor": [("x", "=", 1)]},
+    {"or": []},
+    "x > 1",
+])
+def test_normalize_rejects(predicate):
+    with pytest.raises(ValueError):
+        normalize(predicate)
+
+
+def test_evaluate_without_stats():
+    masks = {"a": np.array([True, False, True]), "b": np.array([False, False, True])}
+    leaf = lambda column, op, value: masks.get(column)  # noqa: E731
+    a, b, untracked = ("a", "=", 1), ("b", "=", 1), ("u", "=", 1)
+    assert evaluate(normalize([a, b]), leaf).tolist() == [False, False, True]
+    assert evaluate(normalize({"or": [a, b]}), leaf).tolist() == [True, False, True]
+    # An AND prunes on the comparisons it can; an OR with an unprunable branch keeps everything.
+    assert evaluate(normalize([a, untracked]), leaf).tolist() == [True, False, True]
+    assert evaluate(normalize({"or": [a, untracked]}), leaf) is None
+
+
+def test_select_matches_brute_force(lake):
+    rng = random.Random(23)
+    for _ in range(RUNS):
+        region, date_range = random_slice(rng)
+        column_filter = random_predicate(rng)
+        predicate = normalize(column_filter)
+        selected = select(lake, region, date_range, predicate)
+        assert selected == expected_row_groups(lake, region, date_range, predicate), column_filter
+        matching = matching_row_groups(lake, region, date_range, to_sql(rng, column_filter))
+        assert matching <= selected, column_filter
+
+
+def test_select_without_predicate(lake):
+    for region, date_range in [(None, None), ("emea", None), (None, ("2025-10-21", "2025-10-22")), ("xx", None)]:
+        assert select(lake, region, date_range, None) == expected_row_groups(lake, region, date_range, None)
+
+
+def test_from_sql_filter_matches_column_filter(lake):
+    con = lake[0]
+    column_types = {**STATS_TYPES, "flag": None}
+    rng = random.Random(25)
+    derived = 0
+    for _ in range(RUNS):
+        region, date_range = random_slice(rng)
+        column_filter = random_predicate(rng)
+        sql_filter = to_sql(rng, column_filter)
+        predicate = from_sql_filter(con, sql_filter, column_types)
+        derived += predicate is not None
+        selected = select(lake, region, date_range, predicate)
+        assert selected == select(lake, region, date_range, normalize(column_filter)), sql_filter
+        assert matching_row_groups(lake, region, date_range, sql_filter) <= selected, sql_filter
+    assert derived > RUNS // 2
+
+
+@pytest.mark.parametrize("sql_filter, expected", [
+    ("amount > 500", ("amount", ">", 500)),
+    ("500 < AMOUNT", ("amount", ">", 500)),
+    ("amount >= CAST(500 AS DOUBLE) AND customer LIKE 'c1%'", ("amount", ">=", 500.0)),
+    ("amount > 500 OR customer LIKE 'c1%'", None),
+    ("qty IN (1, 2) AND flag = 1", ("qty", "IN", (1, 2))),
+    ("order_date BETWEEN '2025-10-01' AND DATE '2025-10-03'",
+     ("order_date", "BETWEEN", (date(2025, 10, 1), date(2025, 10, 3)))),
+    ("order_date > TIMESTAMP '2025-10-20 10:00:00'", None),
+    ("amount + 1 > 500", None),
+    ("customer = 5", None),
+    ("amount > NULL", None),
+    ("amount >", None),
+])
+def test_from_sql_filter_cases(lake, sql_filter, expected):
+    assert from_sql_filter(lake[0], sql_filter, {**STATS_TYPES, "flag": None}) == expected
+
+
+def test_blob_columns_are_not_pruned(tmp_path):
+    """BLOB stats are escaped bytes that do not sort like the values, so only annotated strings get varchar bounds."""
+    part = tmp_path / "files" / "region=emea" / "eod_date=2025-10-24"
+    part.mkdir(parents=True)
+    con = duckdb.connect()
+    con.execute(f"""
+        COPY (SELECT * FROM (VALUES ('a'::BLOB, 'a'), ('\\x80'::BLOB, 'm'), ('b'::BLOB, 'z')) v(bl, name))
+        TO '{part / "part-0.parquet"}';
+    """)
+    create_metadata_schema(con)
+    tree = build_partition_tree(list_lake(con, str(tmp_path)))
+    update_metadata_for_table_date(con, "files", "2025-10-24", partition_files(tree, "files")[LISTING_COLUMNS])
+
+    def stats_types():
+        return dict(con.execute("SELECT column_name, stats_type FROM parquet_column_stats").fetchall())
+
+    assert stats_types() == {"bl": None, "name": "varchar"}
+    assert con.execute("SELECT stats_type FROM parquet_zone_maps WHERE column_name = 'bl'").fetchall() == [(None,)]
+    assert from_sql_filter(con, "bl = 'b' AND name >= 'a'", stats_types()) == ("name", ">=", "a")
+    selection = ZoneMapIndex(con, "files").select(con, predicate=("bl", "=", "b"), stats_types=stats_types())
+    assert list(selection) == [str(part / "part-0.parquet")]
+
+    # Metadata written before BLOBs were excluded is migrated when the schema is (re)created.
+    for table in ("parquet_column_stats", "parquet_zone_maps"):
+        con.execute(f"UPDATE {table} SET stats_type = 'varchar', min_varchar = 'a', max_varchar = 'b'")
+    create_metadata_schema(con)
+    assert stats_types() == {"bl": None, "name": "varchar"}
+    assert con.execute("SELECT stats_type FROM parquet_zone_maps WHERE column_name = 'bl'").fetchall() == [(None,)]
+    con.close()